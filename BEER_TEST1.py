@@ -1,60 +1,49 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
+from price_catalog import get_catalog
 
 st.title('ビール管理アプリ')
 
 days = 1  # 日数を1日に設定
 
-beers_per_day = {}  # 日ごとのビールの本数を保持する辞書
-
-for day in range(1, days + 1):
-    beers_per_day[day] = st.slider(f'{day}日目の本数', 0, 10, 0)
-
-# ビールの種類と価格の辞書
+# ビールの種類と価格の辞書（価格は価格カタログの今日の価格）
+catalog = get_catalog()
 beer_prices = {
-    "サッポロビール350㎜": 250,
-    "サッポロビール500㎜": 300,
-    "アサヒビール350㎜": 250,
-    "アサヒビール500㎜": 300,
-    "サントリービール350㎜": 250,
-    "サントリービール500㎜": 300,
-    "キリンービール350㎜": 250,
-    "キリンービール500㎜": 300,
+    f"{brand}{size}㎜": catalog.price(brand, size)
+    for brand in ["サッポロビール", "アサヒビール", "サントリービール", "キリンービール"]
+    for size in [350, 500]
 }
+beer_names = list(beer_prices.keys())
+price_vector = np.array(list(beer_prices.values()), dtype=np.float64)
 
 # 予算の入力
 budget = st.number_input("予算を入力してください（円）", min_value=0.0)
 
-# 選択されたビールのリストを保持する辞書
-selected_beers_per_day = {}
-
-for day, beers in beers_per_day.items():
-    selected_beers = []
-    for i in range(beers):
-        beer = st.selectbox(f"{day}日目の{len(selected_beers)+1}本目のビールを選択してください", list(beer_prices.keys()))
-        selected_beers.append(beer)
-    selected_beers_per_day[day] = selected_beers
-
-# 各日のビールの選択をセレクトボックスのようなフレームで表示
-st.write("各日のビールの選択:")
-for day, beers in selected_beers_per_day.items():
-    beers_str = '\n'.join(beers)
-    st.text_area(f"{day}日目のビールの選択:", value=beers_str, height=100)
+# 本数は1つの表でまとめて編集する
+st.write("各日のビールの本数:")
+edited = st.data_editor(
+    pd.DataFrame(np.zeros((days, len(beer_names)), dtype=np.int64),
+                 index=[f'{day}日目' for day in range(1, days + 1)], columns=beer_names),
+    column_config={name: st.column_config.NumberColumn(min_value=0, max_value=10, step=1) for name in beer_names},
+    key='quantity_editor',
+)
+# 日ごと・銘柄ごとの本数の表（行が日、列が銘柄）。編集した内容はst.data_editorが覚えておく
+quantities = edited.fillna(0).to_numpy(dtype=np.int64)
 
-# 各日のビールの合計金額を計算する
-total_cost_per_day = {}
-for day, beers in selected_beers_per_day.items():
-    total_cost = sum(beer_prices[beer] for beer in beers)
-    total_cost_per_day[day] = total_cost
+# 各日のビールの合計金額を計算する（本数の表 × 価格のベクトル）
+total_cost_per_day = quantities @ price_vector
 
 # 各日のビールの合計金額を表示
 st.write("各日のビールの合計金額:")
-for day, total_cost in total_cost_per_day.items():
-    st.write(f"{day}日目: {total_cost}円")
+st.dataframe(pd.DataFrame({'本数': quantities.sum(axis=1), '合計金額（円）': total_cost_per_day},
+                          index=edited.index))
 
 # 合計金額が予算を超えているかどうかを判断して表示
-total_cost = sum(total_cost_per_day.values())
+total_cost = round(float(total_cost_per_day.sum()))
 if total_cost <= budget:
     st.write(f"合計金額: {total_cost}円 (予算内)")
 else:
-    st.write(f"合計金額: {total_cost}円 (予算オーバー)")
\ No newline at end of file
+    # 累計で予算を超えた最初の日も表示する
+    over_day = int(np.argmax(np.cumsum(total_cost_per_day) > budget)) + 1
+    st.write(f"合計金額: {total_cost}円 (予算オーバー、{over_day}日目で超えました)")
@@ -5,13 +5,14 @@ import requests
 import os
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-
-# ビール銘柄と価格の辞書
-beer_brands = {
-    "スーパードライ": 200, "一番搾り": 200, "黒ラベル": 200, "プレミアムモルツ": 210,
-    "金麦": 170, "よなよなエール": 210, "豊潤": 280, "オリオン": 200, "サントリー生ビール": 180,
-    "マルエフ": 190, "クラシックラガー": 180, "本麒麟": 170, "淡麗": 170
-}
+from price_catalog import get_catalog
+
+# ビール銘柄と価格の辞書（価格は価格カタログの今日の価格）
+beer_brands = get_catalog().brand_prices(brands=[
+    "スーパードライ", "一番搾り", "黒ラベル", "プレミアムモルツ",
+    "金麦", "よなよなエール", "豊潤", "オリオン", "サントリー生ビール",
+    "マルエフ", "クラシックラガー", "本麒麟", "淡麗",
+])
 
 
 # Streamlitアプリの基本設定
@@ -1,12 +1,9 @@
 import streamlit as st
-import requests
 import os
 import re
 import pandas as pd
 from datetime import datetime
-import requests_cache
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+from http_sessions import get_session
 
 # Dictionary mapping weather codes to descriptions
 weather_descriptions = {
@@ -21,12 +18,8 @@ if 'df_records' not in st.session_state:
         columns=['date', 'day_of_week', 'weather_description', 'temperature_max', 'item_name', 'price_per_item', 'volume'])
 
 def create_session():
-    cache = requests_cache.CachedSession('.cache', expire_after=300)
-    retries = Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
-    adapter = HTTPAdapter(max_retries=retries)
-    cache.mount('http://', adapter)
-    cache.mount('https://', adapter)
-    return cache
+    # 毎回作り直さずに、プロセス内で共有しているセッションを返す
+    return get_session('open-meteo')
 
 def fetch_weather(date):
     session = create_session()
@@ -63,7 +56,7 @@ def fetch_top_item(keyword, ngkeyword='ふるさと エントリー クーポン
     params = {
         'applicationId': APP_ID, 'keyword': keyword, 'format': 'json', 'NGKeyword': ngkeyword
     }
-    response = requests.get(REQUEST_URL, params=params)
+    response = get_session('rakuten').get(REQUEST_URL, params=params)
     if response.status_code == 200:
         items = response.json().get('Items', [])
         if items:
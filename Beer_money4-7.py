@@ -1,13 +1,29 @@
+import time
+_app_import_start = time.perf_counter()
 import streamlit as st
-import requests
 import os
-import re
 import pandas as pd
 from datetime import datetime, timedelta
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+from beer_records import RecordStore
+from beer_storage import RecordDB
+import shared_cache
+from providers import ProviderError, search_items
+from title_parser import parse_title
+from aggregations import budget_summary, month_summary
+from price_catalog import get_catalog
+from drinking_score import score_days
+from instrumentation import export_jsonl, instrument, percentiles, stage, start_run
+from lazy_import import import_report, lazy_module
+
+# 重いモジュールは、その機能を初めて使うときに読み込む
+requests = lazy_module('requests')
+async_fetch = lazy_module('async_fetch')  # asyncio
+chart_render = lazy_module('chart_render')  # matplotlib
+weather_backfill = lazy_module('weather_backfill')
+rakuten_search = lazy_module('rakuten_search')
+
+# 起動時に読み込んだモジュールの秒数（デバッグ表示用）
+APP_IMPORT_SECONDS = time.perf_counter() - _app_import_start
 
 
 
@@ -25,29 +41,56 @@ weather_descriptions = {
     9: "雷雨"
 }
 
-# セッションステートでデータフレームの初期化
-if 'df_records' not in st.session_state:
-    st.session_state.df_records = pd.DataFrame(columns=['date', 'day_of_week', 'weather_description', 'temperature_max', 'item_name', 'price_per_item', 'volume'])
+# 神奈川県川崎市の緯度・経度
+LATITUDE = 35.5206
+LONGITUDE = 139.7172
+
+# 画面に出す記録の月数（今月を含む。グラフもこの期間だけ描く）
+RECORD_VIEW_MONTHS = 24
+
+
+def record_view_start():
+    # 画面に出す期間の最初の日（RECORD_VIEW_MONTHSか月前の月の1日）
+    return (pd.Timestamp.today().to_period('M') - (RECORD_VIEW_MONTHS - 1)).to_timestamp().date()
+
+
+# 記録はSQLiteに保存し、セッション開始時に画面に出す期間の分だけ読み込む（全期間はCSVのダウンロードのときだけ）
+if 'record_db' not in st.session_state:
+    st.session_state.record_db = RecordDB()
+
+# セッションステートで記録ストアの初期化（pd.concatで毎回全体をコピーしないように列バッファで保持）
+# DBが変わっていなければ、ほかのセッションが読み込んだデータフレームを使い回す
+if 'records' not in st.session_state:
+    st.session_state.records = RecordStore.from_frame(
+        shared_cache.record_frame(st.session_state.record_db, record_view_start()))
+# このセッションで追加した行ID（「間違えた！」で自分の記録だけを消すため。DBはセッション間で共有）
+if 'appended_ids' not in st.session_state:
+    st.session_state.appended_ids = []
 
 
+def reload_records():
+    # DBを読み直したら、ストアの最後の行が自分の追加した行とは限らないので行IDも忘れる
+    st.session_state.records = RecordStore.from_frame(
+        shared_cache.record_frame(st.session_state.record_db, record_view_start()))
+    st.session_state.appended_ids = []
+
+
+@instrument()
 def fetch_weather(date):
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": 35.5206,  # 神奈川県川崎市の緯度
-        "longitude": 139.7172,  # 神奈川県川崎市の経度
-        "daily": ["weather_code", "temperature_2m_max"],
-        "timezone": "auto",
-        "start": date.strftime('%Y-%m-%d'),  # APIに渡す日付フォーマット
-        "end": date.strftime('%Y-%m-%d'),
-        "past_days": 7,
-        "forecast_days": 7
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
+    # 選択した日だけをキャッシュから取得（全セッションで共有。無ければその日だけAPIに問い合わせる）
+    try:
+        daily_data = shared_cache.weather_range(LATITUDE, LONGITUDE, date, date)
+    except (requests.RequestException, ProviderError):
+        # 予報APIの期間外（約92日より前・16日より先）は400になる。空にして呼び出し元でエラーを表示する
+        daily_data = pd.DataFrame({'date': pd.to_datetime([]), 'weather_code': [], 'temperature_2m_max': []})
+    daily_dataframe = build_weather_frame(daily_data)
+    st.session_state.weather_data = daily_dataframe
+    return daily_dataframe
+
 
-    daily_data = data['daily']
-    dates = pd.date_range(start=daily_data['time'][0], periods=len(daily_data['weather_code']), freq='D')
-    weather_codes = daily_data['weather_code']
+def build_weather_frame(daily_data):
+    dates = pd.DatetimeIndex(daily_data['date'])
+    weather_codes = daily_data['weather_code'].tolist()
     weather_category = [code // 10 for code in weather_codes]
     weather_descriptions_list = [weather_descriptions.get(code, "Unknown") for code in weather_category]
 
@@ -59,17 +102,13 @@ def fetch_weather(date):
         "weather_description": weather_descriptions_list,
         "temperature_2m_max": daily_data['temperature_2m_max']
     })
-
-    st.session_state.weather_data = daily_dataframe
     return daily_dataframe
 
-REQUEST_URL = 'https://app.rakuten.co.jp/services/api/IchibaItem/Search/20170706'
-
 APP_ID = "1006465413437477144"
 #RAKUTEN_APP_ID = "1006465413437477144"   #茂木アカウントAPIを開発環境として代入
 #APP_ID = os.getenv('RAKUTEN_APP_ID')  # Application ID from environment variable
 
-def fetch_top_item(keyword, ngkeyword='ふるさと エントリー クーポン 倍'):
+def search_rakuten(keyword, ngkeyword):
     # APIリクエストのパラメータ
     params = {
         'applicationId': APP_ID,
@@ -77,13 +116,47 @@ def fetch_top_item(keyword, ngkeyword='ふるさと エントリー クーポン
         'format': 'json',
         'NGKeyword': ngkeyword
     }
-    
-    # APIリクエストを送信
-    response = requests.get(REQUEST_URL, params=params)
-    
+
+    # APIリクエストを送信（取得元はprovidersで切り替え、流量制限・同じリクエストのまとめ・遮断はrequest_layerで行う）
+    return search_items(params)
+
+
+# 検索結果から除外するキーワード
+NG_KEYWORD = 'ふるさと エントリー クーポン 倍'
+
+def fetch_catalog_page(keyword, ngkeyword, **params):
+    # 価格カタログの取り直し用（rakuten_searchは取り直しのスレッドで初めて読み込む）
+    return rakuten_search.fetch_search_page(keyword, ngkeyword, APP_ID, **params)
+
+
+@instrument()
+def fetch_top_item(keyword, ngkeyword=NG_KEYWORD):
+    # 同じキーワード（全角・半角や空白の違いは無視）ならキャッシュした結果を使う
+    result = shared_cache.search(keyword, ngkeyword, search_rakuten)
+    return handle_search_result(result)
+
+
+@instrument()
+def fetch_cheapest_item(keyword, ngkeyword=NG_KEYWORD):
+    # 複数ページを同時に検索し、1本あたりが一番安い商品を選ぶ（届いたページから順に表示を更新）
+    placeholder = st.empty()
+
+    def show_current_best(item, price_per_item):
+        placeholder.write(f'検索中… 今のところ一番安い: {item["itemName"]}（1本あたり{price_per_item:.2f}円）')
+
+    item = rakuten_search.best_price_item(keyword, ngkeyword, APP_ID, on_update=show_current_best)
+    placeholder.empty()
+    if item is None:
+        st.error('APIから商品情報を取得できませんでした。')
+        return None
+    st.session_state.item_info = item
+    return item
+
+
+def handle_search_result(result):
     # ステータスコードと結果の確認
-    if response.status_code == 200:
-        items = response.json().get('Items', [])
+    if result.status_code == 200:
+        items = result.items
         if items:
             st.session_state.item_info = items[0]['Item']
             return items[0]['Item']
@@ -91,30 +164,24 @@ def fetch_top_item(keyword, ngkeyword='ふるさと エントリー クーポン
             st.error('APIから商品情報を取得できませんでした。')
     else:
         # APIからのエラーレスポンスを出力
-        st.error(f'APIリクエストが失敗しました。ステータスコード: {response.status_code}, レスポンス: {response.text}')
+        st.error(f'APIリクエストが失敗しました。ステータスコード: {result.status_code}, レスポンス: {result.text}')
     return None
 
 
+@instrument()
 def display_item_info(item):
     if item:
         item_name = item['itemName']
         item_price = item['itemPrice']
 
-        # 商品名から「本」の前にある数字を抽出
-        quantity_pattern = re.compile(r'(\d+)\s*本')
-        quantity_match = quantity_pattern.search(item_name)
-
-        # 商品名から「ml」の前にある数字を抽出
-        volume_pattern = re.compile(r'(\d+)\s*ml')
-        volume_match = volume_pattern.search(item_name)
+        # 商品名から数量（本・缶・ケース）と内容量（ml）を抽出
+        quantity, volume = parse_title(item_name)
         
         info_texts = []
-        if quantity_match:
-            quantity = int(quantity_match.group(1))
+        if quantity:
             price_per_item = item_price / quantity
             info_texts.append(f'数量: {quantity}本, 1本あたりの価格: {price_per_item:.2f}円')
-        if volume_match:
-            volume = int(volume_match.group(1))
+        if volume:
             info_texts.append(f'内容量: {volume}ml')
 
         info_text = ', '.join(info_texts)
@@ -134,14 +201,10 @@ def add_to_dataframe(selected_date):
         # 商品情報の解析
         item_name = item_info['itemName']
         item_price = item_info['itemPrice']
-        quantity_pattern = re.compile(r'(\d+)\s*本')
-        quantity_match = quantity_pattern.search(item_name)
-        volume_pattern = re.compile(r'(\d+)\s*ml')
-        volume_match = volume_pattern.search(item_name)
-        price_per_item = (item_price / int(quantity_match.group(1))) if quantity_match else None
-        volume = int(volume_match.group(1)) if volume_match else None
-
-        new_record = pd.DataFrame([{
+        quantity, volume = parse_title(item_name)
+        price_per_item = (item_price / quantity) if quantity else None
+
+        new_record = {
             'date': weather_info['date'],
             'day_of_week': weather_info['day_of_week'],
             "weather_category": weather_info['weather_category'],
@@ -150,44 +213,96 @@ def add_to_dataframe(selected_date):
             'item_name': item_name,
             'price_per_item': price_per_item,
             'volume': volume
-        }])
+        }
+
+        st.session_state.appended_ids.append(st.session_state.record_db.append(new_record))
+        st.session_state.records.append(new_record)
+
+def record_drink(selected_weather, selected_item):
+    # 商品名と価格を解析
+    item_name = selected_item['itemName']
+    item_price = selected_item['itemPrice']
+    quantity, volume = parse_title(item_name)
+    price_per_item = item_price / quantity if quantity else None
+    append_record(selected_weather, item_name, price_per_item, volume)
+
+
+def record_catalog_drink(selected_weather, brand, size_ml):
+    # 価格カタログの今日の価格で記録する（楽天に問い合わせない）
+    price_per_item = get_catalog().price(brand, size_ml)
+    append_record(selected_weather, f'{brand} {size_ml}ml', price_per_item, size_ml)
+
+
+def append_record(selected_weather, item_name, price_per_item, volume):
+    # 新しいレコードを作成
+    new_record = {
+        'date': selected_weather['date'],
+        'day_of_week': selected_weather['day_of_week'],
+        'weather_category': selected_weather['weather_category'],
+        'weather_description': selected_weather['weather_description'],
+        'temperature_max': selected_weather['temperature_2m_max'],
+        'item_name': item_name,
+        'price_per_item': price_per_item,
+        'volume': volume
+    }
+
+    # DBと記録ストアに新しいレコードを1行だけ追加
+    st.session_state.appended_ids.append(st.session_state.record_db.append(new_record))
+    st.session_state.records.append(new_record)
+
+
+def search_and_record(keyword, selected_date):
+    # 楽天の検索と天気の取得を同時に行う（待ち時間は遅い方の分だけ）
+    results = async_fetch.run_concurrently({
+        'item': (shared_cache.search, (keyword, NG_KEYWORD, search_rakuten)),
+        'weather': (shared_cache.weather_range, (LATITUDE, LONGITUDE, selected_date, selected_date)),
+    })
+    if isinstance(results['item'], Exception) or isinstance(results['weather'], Exception):
+        st.error('商品情報または天気情報を取得できませんでした。')
+        return
+
+    top_item = handle_search_result(results['item'])
+    display_item_info(top_item)
+    df_weather = build_weather_frame(results['weather'])
+    st.session_state.weather_data = df_weather
+    selected_weather = df_weather[df_weather['date'] == pd.Timestamp(selected_date)]
+    if selected_weather.empty:
+        st.error('選択された日付の天気データはありません。')
+        return
+    if top_item is None:  # エラーはhandle_search_resultで表示済み
+        return
+
+    st.session_state.selected_item = top_item
+    st.session_state.selected_weather = selected_weather
+    record_drink(selected_weather.iloc[0], top_item)
+    st.write('データを記録しました！')
+    st.dataframe(st.session_state.records.to_frame())
 
-        st.session_state.df_records = pd.concat([st.session_state.df_records, new_record], ignore_index=True)
 
 ## 今月飲んだビールの回数を計算して表示する関数
-def display_beers_consumed(df):
-    current_month = datetime.now().strftime('%Y-%m')
-    df['date'] = pd.to_datetime(df['date'])
-    monthly_beers = df[df['date'].dt.strftime('%Y-%m') == current_month]
-    beer_sessions = len(monthly_beers)
+@instrument()
+def display_beers_consumed(records):
+    # 今月の集計を読む（記録は書き換えない）
+    beer_sessions = month_summary(records).count
     st.write(f"今月飲んだビールの本数: {beer_sessions}", f"🍺" * beer_sessions)
 
 
 # 予算計算と何本飲めるかを表示する関数（ver4修正部分）
-def display_budget_and_beers(df, budget):
-    current_month = datetime.now().strftime('%Y-%m')
-    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m')
-    # 月ごとにフィルタリング
-    monthly_expenses = df[df['date'] == current_month]['price_per_item'].sum() if 'price_per_item' in df.columns else 0
-    remaining_budget = budget - monthly_expenses
-
-    beers_third = remaining_budget // 170
-    beers_standard = remaining_budget // 200
-    beers_premium = remaining_budget // 240
-    beers_craft = remaining_budget // 350
-
-    st.write(f"今月のビール金額: ¥{int(monthly_expenses)}、", f"今月の残り予算: ¥{int(remaining_budget)}")
-    st.write(f"第３のビール: 今月あと{int(beers_third)}本", f"🍺" * int(beers_third))
-    st.write(f"スタンダードビール: 今月あと{int(beers_standard)}本", f"🍺" * int(beers_standard))
-    st.write(f"プレミアムビール: 今月あと{int(beers_premium)}本", f"🍺" * int(beers_premium))
-    st.write(f"クラフトビール: 今月あと{int(beers_craft)}本", f"🍺" * int(beers_craft))
-
-
-def display_beers_consumed(df):
-    current_month = datetime.now().strftime('%Y-%m')
-    df['date'] = pd.to_datetime(df['date'])
-    monthly_beers = df[df['date'].dt.strftime('%Y-%m') == current_month]
-    beer_sessions = len(monthly_beers)
+@instrument()
+def display_budget_and_beers(records, budget):
+    # 今月の出費と、価格帯ごとにあと何本飲めるかを計算（記録は書き換えない）
+    # 価格帯の価格は価格カタログの今日の価格（楽天からの取り直しは別スレッドで行う）
+    summary = budget_summary(records, budget, tiers=get_catalog().tier_prices())
+
+    st.write(f"今月のビール金額: ¥{int(summary.spent)}、", f"今月の残り予算: ¥{int(summary.remaining)}")
+    for name, beers_left in summary.beers_left.items():
+        st.write(f"{name}: 今月あと{beers_left}本", f"🍺" * beers_left)
+
+
+@instrument()
+def display_beers_consumed(records):
+    # 今月の集計を読む（記録は書き換えない）
+    beer_sessions = month_summary(records).count
     st.write(f"今月飲んだビールの本数: {beer_sessions}", f"🍺" * beer_sessions)
     
     # 背景色を設定
@@ -209,43 +324,26 @@ def display_beers_consumed(df):
 
 
 def determine_drinking_days(df_weather):
-    # 気温が最も高い日と最も低い日を見つける
-    max_temp_day = df_weather[df_weather['temperature_max'] == df_weather['temperature_max'].max()]
-    min_temp_day = df_weather[df_weather['temperature_max'] == df_weather['temperature_max'].min()]
-
-    # 気温が最も高い日と最も低い日に「◎」「△」を追加し、その他の日に「〇」を追加
-    for index, row in df_weather.iterrows():
-        if row['date'] in max_temp_day['date'].values:
-            df_weather.at[index, 'drinking_day'] = '◎'
-            df_weather.at[index, 'number'] = 2  # 2本
-        elif row['date'] in min_temp_day['date'].values:
-            df_weather.at[index, 'drinking_day'] = '△'
-            df_weather.at[index, 'number'] = 0  # 1本 or 0
-        else:
-            df_weather.at[index, 'drinking_day'] = '〇'
-            df_weather.at[index, 'number'] = 1  # 1本
-
-    return df_weather
+    # 1週間の中で気温が最も高い日に「◎」、最も低い日に「△」、その他の日に「〇」を付ける
+    return score_days(df_weather)
 
 
 
+@instrument()
 def fetch_weather_week(selected_date):
     end_date = selected_date + timedelta(days=6)
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": 35.5206, "longitude": 139.7172, "daily": ["weather_code", "temperature_2m_max"],
-        "timezone": "auto", "start": selected_date.strftime('%Y-%m-%d'), "end": end_date.strftime('%Y-%m-%d')
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
+    # 1週間分をキャッシュから取得（足りない日だけまとめてAPIに問い合わせる）
+    try:
+        daily_data = shared_cache.weather_range(LATITUDE, LONGITUDE, selected_date, end_date)
+    except (requests.RequestException, ProviderError):
+        daily_data = pd.DataFrame()
 
     # 天気情報をデータフレームに表示
     weather_data = []
-    if 'daily' in data:
-        daily_data = data['daily']
-
+    if not daily_data.empty:
         for i in range(len(daily_data['weather_code'])):
-            date = (selected_date + timedelta(days=i)).strftime('%Y-%m-%d')
+            # キャッシュや記録から返った日は抜けがあることがあるので、返ってきた日付をそのまま使う
+            date = pd.Timestamp(daily_data['date'][i]).strftime('%Y-%m-%d')
             weather_code = daily_data['weather_code'][i]
             temperature_max = daily_data['temperature_2m_max'][i]
             weather_category = weather_code // 10
@@ -261,20 +359,62 @@ def fetch_weather_week(selected_date):
 
 
 
+# 設定すると再実行ごとの計測結果をこのファイルにJSON Linesで追記する
+TIMING_LOG_PATH = os.getenv('BEER_MONEY_TIMING_LOG')
+
+
+def display_timing_panel(run):
+    # 再実行ごとの段階別の処理時間（折りたたみ表示）
+    with st.expander('デバッグ: 処理時間'):
+        if run.stages:
+            st.dataframe(pd.DataFrame(run.stages))
+        st.write(f'起動時の読み込み: {APP_IMPORT_SECONDS:.3f}秒')
+        imports = import_report()
+        if imports:
+            st.write('あとから読み込んだモジュール（秒）')
+            st.dataframe(pd.Series(imports, name='seconds'))
+        stats = percentiles()
+        if stats:
+            st.write('直近の処理時間（秒）')
+            st.dataframe(pd.DataFrame.from_dict(stats, orient='index'))
+
+
 def main():
+    run = start_run()
+    # 価格カタログは1日1回、別スレッドで楽天から取り直す（プロセスで1つだけ動く）
+    get_catalog().start_background_refresh(fetch_catalog_page, NG_KEYWORD, page=1, sort='+itemPrice')
     st.title('毎日ビールを飲みたい🍻')
 
 
-    # CSVファイルをアップロードして読み込む
+    # CSVファイルをアップロードして読み込む（DBは全員で共有しているので、既定では今の記録に追加する）
     uploaded_file = st.file_uploader("アップロード")
-    if uploaded_file is not None:
-        data = pd.read_csv(uploaded_file)
-        st.session_state.df_records = data
+    replace_records = st.checkbox("今の記録をすべて置き換える（ほかの人の記録も消えます）")
+    if uploaded_file is not None and st.button('取り込む'):
+        st.session_state.record_db.import_csv(uploaded_file, replace=replace_records)
+        reload_records()
         st.write('Data successfully loaded!')
-        st.dataframe(st.session_state.df_records)
+        st.dataframe(st.session_state.records.to_frame())
+
+    # 天気が空の記録（予報の期間より前の記録など）に過去の天気をまとめて埋める
+    if st.button('過去の天気を補完'):
+        # 天気が空の行だけを行IDつきで読み、その行だけを書き換える（ほかの行には触らない）
+        df_records = st.session_state.record_db.load(with_ids=True)
+        df_missing = df_records[df_records['temperature_max'].isna()]
+        failed = []
+        if not df_missing.empty:
+            df_filled, failed = weather_backfill.backfill_weather(df_missing, LATITUDE, LONGITUDE, weather_descriptions)
+            # 取得できた日の行だけを書き換える
+            st.session_state.record_db.update(df_filled[df_filled['temperature_max'].notna()])
+            reload_records()
+        if failed:
+            periods = '、'.join(f'{start}〜{end}' for start, end in failed)
+            st.error(f'次の期間の天気を取得できませんでした: {periods}')
+        else:
+            st.write('過去の天気を補完しました！')
 
     base_keyword = 'ビール'
     additional_keyword = st.text_input("ビールの銘柄情報を入力してください")
+    find_cheapest = st.checkbox("1本あたりが一番安い商品を探す（複数ページを検索）")
     
     # 日付選択は常に表示
     selected_date = st.date_input("日付を選択してください", datetime.today())
@@ -282,7 +422,7 @@ def main():
     if st.button('ビールを検索'):
         # 組み合わせたキーワード
         keyword = f'{base_keyword} {additional_keyword}'
-        top_item = fetch_top_item(keyword)
+        top_item = fetch_cheapest_item(keyword) if find_cheapest else fetch_top_item(keyword)
         display_item_info(top_item)
         st.session_state.selected_item = top_item  # 商品情報をセッションステートに保存
     if st.button('天気を取得'):
@@ -294,96 +434,72 @@ def main():
         else:
             st.error('選択された日付の天気データはありません。')
 
+    if st.button('検索して記録'):
+        search_and_record(f'{base_keyword} {additional_keyword}', selected_date)
+
+    # 価格カタログの銘柄から選んで記録する（検索しなくてよい）
+    catalog_entries = get_catalog().entries()
+    catalog_entry = st.selectbox("カタログから銘柄を選ぶ", catalog_entries,
+                                 format_func=lambda entry: f"{entry[0]} {entry[1]}ml（{get_catalog().price(*entry):.0f}円）")
+    if st.button('カタログの価格で飲んだ！'):
+        if hasattr(st.session_state, 'selected_weather'):
+            record_catalog_drink(st.session_state.selected_weather.iloc[0], *catalog_entry)
+            st.write('データを記録しました！')
+            st.dataframe(st.session_state.records.to_frame())
+        else:
+            st.error('天気情報がまだ取得されていません。')
+
     if st.button('飲んだ！'):
         if hasattr(st.session_state, 'selected_weather') and hasattr(st.session_state, 'selected_item'):
             # 選択された天気と商品情報を取得
-            selected_weather = st.session_state.selected_weather.iloc[0]
-            selected_item = st.session_state.selected_item
-
-            # 商品名と価格を解析
-            item_name = selected_item['itemName']
-            item_price = selected_item['itemPrice']
-            quantity_pattern = re.compile(r'(\d+)\s*本')
-            quantity_match = quantity_pattern.search(item_name)
-            volume_pattern = re.compile(r'(\d+)\s*ml')
-            volume_match = volume_pattern.search(item_name)
-
-            quantity = int(quantity_match.group(1)) if quantity_match else None
-            price_per_item = item_price / quantity if quantity else None
-            volume = int(volume_match.group(1)) if volume_match else None
-
-            # 新しいレコードを作成
-            new_record = {
-                'date': selected_weather['date'],
-                'day_of_week': selected_weather['day_of_week'],
-                'weather_category': selected_weather['weather_category'],
-                'weather_description': selected_weather['weather_description'],
-                'temperature_max': selected_weather['temperature_2m_max'],
-                'item_name': item_name,
-                'price_per_item': price_per_item,
-                'volume': volume
-            }
-
-            # データフレームに新しいレコードを追加
-            new_record_df = pd.DataFrame([new_record])
-            st.session_state.df_records = pd.concat([st.session_state.df_records, new_record_df], ignore_index=True)
+            record_drink(st.session_state.selected_weather.iloc[0], st.session_state.selected_item)
 
             st.write('データを記録しました！')
-            st.dataframe(st.session_state.df_records)
+            st.dataframe(st.session_state.records.to_frame())
         else:
             st.error('商品情報または天気情報がまだ取得されていません。')
     
     # データフレームの最新の1行を削除するボタン（ver4追加部分）
     if st.button('間違えた！'):
-        if not st.session_state.df_records.empty:
-            st.session_state.df_records = st.session_state.df_records[:-1]
+        # このセッションで追加した最新の記録だけを消す（ストアの最後の行もその記録）
+        if st.session_state.appended_ids:
+            st.session_state.record_db.delete(st.session_state.appended_ids.pop())
+            st.session_state.records.pop()
             st.write("最新の記録を削除しました。")
-            st.dataframe(st.session_state.df_records)
+            st.dataframe(st.session_state.records.to_frame())
         else:
-            st.error("データフレームが空です。削除するデータがありません。")
+            st.error("このセッションで記録したデータがありません。削除するデータがありません。")
 
     # スライダーで予算を設定（ver4追加部分）
     budget = st.slider("予算を設定してください", 1000, 10000, 5000)
 
-    if 'df_records' in st.session_state:
-        display_beers_consumed(st.session_state.df_records)
-        display_budget_and_beers(st.session_state.df_records, budget)  # 予算を引数として渡す
+    if 'records' in st.session_state:
+        display_beers_consumed(st.session_state.records)
+        display_budget_and_beers(st.session_state.records, budget)  # 予算を引数として渡す
 
     else:
         st.write("データがありません。")
 
     # グラフを描画（ver4追加部分）
-    if not st.session_state.df_records.empty:
-        plt.figure(figsize=(10, 6))
-        df = st.session_state.df_records.copy()
-        df['date'] = pd.to_datetime(df['date'])
-        df['Month'] = df['date'].dt.to_period('M')
-        monthly_price = df.groupby('Month')['price_per_item'].sum()
-        plt.bar(monthly_price.index.astype('datetime64[ns]'), monthly_price.values, color='blue', label='Monthly Cost', width=20)
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
-        plt.gca().xaxis.set_major_locator(mdates.MonthLocator())
-        plt.axhline(y=budget, color='r', linestyle='--', label=f'Budget: ¥{budget}')
-        plt.title('Beer Cost')
-        plt.xlabel('Month')
-        plt.ylabel('Total Cost (JPY)')
-        plt.ylim(bottom=0)
-        plt.grid(axis='y')
-        plt.xticks(rotation=45)
-        plt.legend()  # 凡例を追加
-        plt.tight_layout()
-        st.pyplot(plt)
+    if not st.session_state.records.empty:
+        with stage('chart'):
+            # 記録か予算が変わったときだけ描き直す（図はセッションごとに1つを使い回す）
+            if 'cost_chart' not in st.session_state:
+                st.session_state.cost_chart = chart_render.MonthlyCostChart()
+            st.image(st.session_state.cost_chart.render(st.session_state.records, budget))
     else:
         st.write("No data")  # デバッグ情報
 
-    # ダウンロードボタン
-    if st.session_state.df_records is not None and not st.session_state.df_records.empty:
-        csv = st.session_state.df_records.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')  # utf-8-sig を使用してエンコードする
-        st.download_button(
-            label="Download data as CSV",
-            data=csv,
-            file_name='data.csv',
-            mime='text/csv',
-        )
+    # ダウンロードボタン（画面に出していない古い記録も含めるので、押されたときだけ全期間を読み込む）
+    if st.session_state.record_db.count():
+        if st.button('CSVを作成'):
+            csv = shared_cache.record_frame(st.session_state.record_db).to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')  # utf-8-sig を使用してエンコードする
+            st.download_button(
+                label="Download data as CSV",
+                data=csv,
+                file_name='data.csv',
+                mime='text/csv',
+            )
 
     else:
         st.write("No data to download")
@@ -401,5 +517,9 @@ def main():
         # 合計数を計算して表示
         st.write(f"今週のビール本数予測: {df_weather['number'].sum()}")
 
+    display_timing_panel(run)
+    if TIMING_LOG_PATH:
+        export_jsonl(run, TIMING_LOG_PATH)
+
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
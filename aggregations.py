@@ -0,0 +1,76 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from monthly_aggregates import current_month_number, days_to_months
+
+
+# 集計結果（小さな値だけを返し、記録そのものは変更しない）
+MonthSummary = namedtuple('MonthSummary', ['month', 'count', 'price_sum', 'volume_sum'])
+BudgetSummary = namedtuple('BudgetSummary', ['budget', 'spent', 'remaining', 'beers_left'])
+
+# 予算から何本飲めるかを計算するときのビールの価格帯（円）
+DEFAULT_PRICE_TIERS = {
+    '第３のビール': 170,
+    'スタンダードビール': 200,
+    'プレミアムビール': 240,
+    'クラフトビール': 350,
+}
+
+# RecordStoreの(バージョン) -> 月数の配列
+_month_cache = {}
+_MONTH_CACHE_SIZE = 8
+
+
+def month_numbers(records):
+    """記録ごとの月数（1970年1月から）の読み取り専用の配列
+
+    RecordStoreなら日数の列から作ってバージョンごとに覚えておく。データフレームなら毎回date列を読むだけで、列は書き換えない。
+    """
+    if isinstance(records, pd.DataFrame):
+        dates = pd.to_datetime(records['date']).to_numpy().astype('datetime64[M]')
+        months = np.where(np.isnat(dates), np.iinfo(np.int64).min, dates.astype(np.int64))
+    else:
+        months = _month_cache.get(records.version)
+        if months is None:
+            days = records.date_days()
+            months = np.where(days == np.iinfo(np.int64).min, np.iinfo(np.int64).min, days_to_months(days))
+            if len(_month_cache) >= _MONTH_CACHE_SIZE:
+                _month_cache.pop(next(iter(_month_cache)))
+            _month_cache[records.version] = months
+    months.flags.writeable = False
+    return months
+
+
+def month_summary(records, month=None):
+    """指定した月（省略時は今月）の本数・金額・内容量の合計"""
+    month = current_month_number() if month is None else month
+    if not isinstance(records, pd.DataFrame):
+        # RecordStoreは月ごとの集計を持っているので走査しない
+        monthly = records.monthly
+        return MonthSummary(month, monthly.count(month), monthly.price_sum(month), monthly.volume_sum(month))
+    mask = month_numbers(records) == month
+    prices = pd.to_numeric(records['price_per_item'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    volumes = pd.to_numeric(records['volume'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return MonthSummary(month, int(mask.sum()), float(np.nansum(prices[mask])), float(np.nansum(volumes[mask])))
+
+
+def budget_summary(records, budget, tiers=None, month=None):
+    """今月の出費と残りの予算、価格帯ごとにあと何本飲めるか"""
+    tiers = DEFAULT_PRICE_TIERS if tiers is None else tiers
+    spent = month_summary(records, month).price_sum
+    remaining = budget - spent
+    return BudgetSummary(budget, spent, remaining, {name: int(remaining // price) for name, price in tiers.items()})
+
+
+def monthly_price_totals(records):
+    """月の初日をインデックスにした月ごとの金額（グラフ用）"""
+    if not isinstance(records, pd.DataFrame):
+        return records.monthly.price_series()
+    months = month_numbers(records)
+    valid = months != np.iinfo(np.int64).min
+    prices = pd.to_numeric(records['price_per_item'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    totals = pd.Series(prices[valid]).groupby(months[valid]).sum()
+    index = pd.DatetimeIndex(totals.index.to_numpy(dtype=np.int64).view('datetime64[M]').astype('datetime64[ns]'))
+    return pd.Series(totals.to_numpy(), index=index, dtype=np.float64)
@@ -0,0 +1,35 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 1つのリクエストを待つ最大秒数
+DEFAULT_TIMEOUT = 10
+
+# 再実行をまたいで使い回すスレッドプール（タイムアウトした呼び出しを待たずに戻れるよう既定のものは使わない）
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='async_fetch')
+
+
+async def _call_with_timeout(func, args, timeout):
+    # requestsは同期APIなので、スレッドで動かしてイベントループからは待つだけにする
+    # 計測中の段階がスレッド側でも見えるように、呼び出し元のコンテキストを引き継ぐ
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await asyncio.wait_for(loop.run_in_executor(_executor, context.run, func, *args), timeout)
+
+
+async def gather_calls(calls, timeout=DEFAULT_TIMEOUT):
+    """{名前: (関数, 引数のタプル)}を同時に実行し、{名前: 結果または例外}を返す"""
+    names = list(calls)
+    results = await asyncio.gather(
+        *(_call_with_timeout(func, args, timeout) for func, args in calls.values()),
+        return_exceptions=True)
+    return dict(zip(names, results))
+
+
+def run_concurrently(calls, timeout=DEFAULT_TIMEOUT):
+    """同期コード（Streamlitのスクリプト）から呼ぶ入口。全体の待ち時間は一番遅い呼び出しの分だけになる
+
+    関数はスクリプトのスレッド以外で動くので、st.*やst.session_stateには触れないものを渡すこと。
+    """
+    return asyncio.run(gather_calls(calls, timeout))
@@ -0,0 +1,181 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from monthly_aggregates import MonthlyAggregates
+from record_schema import (CATEGORY_COLUMNS, INT_MISSING, NUMERIC_COLUMNS, NUMERIC_DTYPES, RECORD_COLUMNS,
+                           as_float, buffer_to_array, is_missing, to_buffer_array, to_buffer_value)
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+# ストアのバージョン番号（別のストアと番号が重ならないようにプロセス内で通し番号にする）
+_versions = itertools.count(1)
+
+
+def to_day_number(value):
+    """日付（文字列・datetime・Timestamp）を1970-01-01からの日数に変換"""
+    if is_missing(value):
+        return np.iinfo(np.int64).min
+    return int((np.datetime64(pd.Timestamp(value).date(), 'D') - EPOCH).astype(np.int64))
+
+
+class RecordStore:
+    """飲んだ記録を列ごとの配列で保持するストア（追加は償却O(1)）"""
+
+    def __init__(self, capacity=64):
+        self._size = 0
+        self._capacity = max(int(capacity), 1)
+        self._dates = np.empty(self._capacity, dtype=np.int64)
+        # 数値の列はrecord_schemaの小さい型で持つ（整数の列の欠損はINT_MISSING）
+        self._numbers = {col: np.empty(self._capacity, dtype=NUMERIC_DTYPES[col]) for col in NUMERIC_COLUMNS}
+        self._codes = {col: np.empty(self._capacity, dtype=np.int32) for col in CATEGORY_COLUMNS}
+        self._categories = {col: [] for col in CATEGORY_COLUMNS}
+        self._category_index = {col: {} for col in CATEGORY_COLUMNS}
+        # 月ごとの集計（追加・削除のたびに更新するので表示のたびに全件を走査しなくてよい）
+        self.monthly = MonthlyAggregates()
+        # 中身が変わるたびに変わる番号（グラフなどのキャッシュのキーに使う）
+        self.version = next(_versions)
+        # ビュー（to_frameなど）として外に渡した行数。この行より前に書き込むときはバッファを作り直す
+        self._viewed = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def empty(self):
+        return self._size == 0
+
+    def _grow(self, needed):
+        # 容量が足りなくなったら2倍ずつ広げる
+        new_capacity = self._capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+        if new_capacity == self._capacity:
+            return
+        self._dates = np.resize(self._dates, new_capacity)
+        for col in NUMERIC_COLUMNS:
+            self._numbers[col] = np.resize(self._numbers[col], new_capacity)
+        for col in CATEGORY_COLUMNS:
+            self._codes[col] = np.resize(self._codes[col], new_capacity)
+        self._capacity = new_capacity
+
+    def _before_write(self, start):
+        # pop・clearの後に渡したビューの範囲へ書き込むと、前に作ったデータフレームの中身が変わってしまう。
+        # そのときだけバッファをコピーして、前のビューは元のバッファを見続けるようにする
+        if start >= self._viewed:
+            return
+        self._dates = self._dates.copy()
+        self._numbers = {col: values.copy() for col, values in self._numbers.items()}
+        self._codes = {col: codes.copy() for col, codes in self._codes.items()}
+        self._viewed = 0
+
+    def _view(self, values):
+        view = values[:self._size]
+        view.flags.writeable = False
+        self._viewed = max(self._viewed, self._size)
+        return view
+
+    def _encode(self, col, value):
+        # 欠損値はコード-1（pandasのCategoricalと同じ扱い）
+        if is_missing(value):
+            return -1
+        index = self._category_index[col]
+        code = index.get(value)
+        if code is None:
+            code = len(self._categories[col])
+            self._categories[col].append(value)
+            index[value] = code
+        return code
+
+    def append(self, record):
+        """1件の記録（辞書）を末尾に追加"""
+        self._grow(self._size + 1)
+        i = self._size
+        self._before_write(i)
+        self._dates[i] = to_day_number(record.get('date'))
+        for col in NUMERIC_COLUMNS:
+            self._numbers[col][i] = to_buffer_value(col, record.get(col))
+        for col in CATEGORY_COLUMNS:
+            self._codes[col][i] = self._encode(col, record.get(col))
+        self._size += 1
+        self.version = next(_versions)
+        self.monthly.add(self._dates[i], *self._price_and_volume(i))
+
+    def extend(self, df):
+        """データフレーム（CSVの読み込み結果など）をまとめて追加"""
+        n = len(df)
+        if n == 0:
+            return
+        self._grow(self._size + n)
+        start, stop = self._size, self._size + n
+        self._before_write(start)
+        dates = pd.to_datetime(df['date']) if 'date' in df.columns else pd.Series(pd.NaT, index=df.index)
+        days = dates.values.astype('datetime64[D]').astype(np.int64)
+        self._dates[start:stop] = np.where(dates.isna().values, np.iinfo(np.int64).min, days)
+        for col in NUMERIC_COLUMNS:
+            values = df[col] if col in df.columns else pd.Series([None] * n)
+            self._numbers[col][start:stop] = to_buffer_array(col, values)
+        for col in CATEGORY_COLUMNS:
+            values = df[col] if col in df.columns else pd.Series([None] * n)
+            self._codes[col][start:stop] = [self._encode(col, v) for v in values]
+        self._size = stop
+        self.version = next(_versions)
+        self.monthly.add_many(self._dates[start:stop], self.float_column('price_per_item', start, stop),
+                              self.float_column('volume', start, stop))
+
+    def pop(self):
+        """最新の1件を削除（「間違えた！」ボタン用）"""
+        if self._size == 0:
+            raise IndexError('pop from empty RecordStore')
+        self._size -= 1
+        self.version = next(_versions)
+        i = self._size
+        self.monthly.remove(self._dates[i], *self._price_and_volume(i))
+
+    def _price_and_volume(self, i):
+        return (as_float('price_per_item', self._numbers['price_per_item'][i]),
+                as_float('volume', self._numbers['volume'][i]))
+
+    def clear(self):
+        self._size = 0
+        self.version = next(_versions)
+        self.monthly.clear()
+
+    def date_days(self):
+        """日付列（日数）の読み取り専用ビュー"""
+        return self._view(self._dates)
+
+    def column(self, col):
+        """数値列の読み取り専用ビュー（整数の列の欠損はINT_MISSING）"""
+        return self._view(self._numbers[col])
+
+    def float_column(self, col, start=0, stop=None):
+        """数値列をfloat64（欠損はnan）にした配列（集計用のコピー）"""
+        values = self._numbers[col][start:self._size if stop is None else stop].astype(np.float64)
+        if NUMERIC_DTYPES[col].kind != 'f':
+            values[values == INT_MISSING] = np.nan
+        return values
+
+    def to_frame(self):
+        """表示用のデータフレームを作成（型はrecord_schemaに従う）
+
+        数値列はバッファをコピーせずに読み取り専用のビューで参照する。後から追加・削除しても、
+        作ったデータフレームの中身は変わらない（上書きになるときはストアの方がバッファを作り直す）。
+        データフレームに書き込むとエラーになるので、書き換えるときはcopy()してから使う。
+        """
+        data = {}
+        # 欠損日（int64の最小値）はdatetime64ではそのままNaTになる
+        data['date'] = pd.to_datetime(self._view(self._dates).view('datetime64[D]'))
+        for col in RECORD_COLUMNS[1:]:
+            if col in NUMERIC_DTYPES:
+                data[col] = buffer_to_array(col, self._view(self._numbers[col]))
+            else:
+                data[col] = pd.Categorical.from_codes(self._view(self._codes[col]), categories=self._categories[col])
+        return pd.DataFrame(data, columns=RECORD_COLUMNS, copy=False)
+
+    @classmethod
+    def from_frame(cls, df):
+        store = cls(capacity=len(df))
+        store.extend(df)
+        return store
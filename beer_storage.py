@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+
+import pandas as pd
+
+from record_schema import RECORD_COLUMNS, apply_schema
+from title_parser import parse_titles
+
+
+# 記録を保存するSQLiteファイル
+DB_PATH = 'beer_records.db'
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT,
+    day_of_week TEXT,
+    weather_category REAL,
+    weather_description TEXT,
+    temperature_max REAL,
+    item_name TEXT,
+    price_per_item REAL,
+    volume REAL
+)
+"""
+CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS records_date ON records (date)"
+# 記録を書き換えるたびに1つ増やす版数（1行だけのテーブル。読み込んだ記録のキャッシュのキーに使う）
+CREATE_META_SQL = "CREATE TABLE IF NOT EXISTS record_meta (id INTEGER PRIMARY KEY CHECK (id = 0), revision INTEGER)"
+INIT_META_SQL = "INSERT OR IGNORE INTO record_meta VALUES (0, 0)"
+BUMP_REVISION_SQL = "UPDATE record_meta SET revision = revision + 1 WHERE id = 0"
+
+
+def _to_date_text(value):
+    # 日付はYYYY-MM-DDの文字列で保存（文字列のまま範囲検索ができる）
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def _to_sql_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if hasattr(value, 'item'):  # numpyの数値をPythonの数値に戻す
+        return value.item()
+    return value
+
+
+class RecordDB:
+    """飲んだ記録をSQLiteに1行ずつ保存するストレージ"""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Streamlitは再実行ごとにスレッドが変わることがあるのでcheck_same_threadを外してロックで守る
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(CREATE_TABLE_SQL)
+            self._conn.execute(CREATE_INDEX_SQL)
+            self._conn.execute(CREATE_META_SQL)
+            self._conn.execute(INIT_META_SQL)
+
+    def close(self):
+        self._conn.close()
+
+    def append(self, record):
+        """1件追加して行IDを返す（「飲んだ！」ボタン用）"""
+        values = [_to_date_text(record.get('date'))] + [_to_sql_value(record.get(col)) for col in RECORD_COLUMNS[1:]]
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"INSERT INTO records ({', '.join(RECORD_COLUMNS)}) VALUES ({', '.join('?' * len(RECORD_COLUMNS))})",
+                values)
+            self._conn.execute(BUMP_REVISION_SQL)
+        return cursor.lastrowid
+
+    def delete(self, row_id):
+        """appendが返した行IDの1件だけを削除（「間違えた！」ボタン用）。削除したらTrue
+
+        DBは全セッションで共有しているので、MAX(id)ではなく自分が追加した行IDで消す。
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM records WHERE id = ?", (row_id,))
+            self._conn.execute(BUMP_REVISION_SQL)
+        return cursor.rowcount > 0
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def fingerprint(self):
+        """記録が変わると変わる値（追加・削除・書き換え・取り込みのたびに増える版数）"""
+        with self._lock:
+            return self._conn.execute("SELECT revision FROM record_meta WHERE id = 0").fetchone()[0]
+
+    def load(self, start_date=None, end_date=None, with_ids=False):
+        """期間を指定して記録を読み込む（指定なしなら全件）。with_idsなら行IDをインデックスにする"""
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append("date >= ?")
+            params.append(_to_date_text(start_date))
+        if end_date is not None:
+            conditions.append("date <= ?")
+            params.append(_to_date_text(end_date))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            df = pd.read_sql_query(f"SELECT id, {', '.join(RECORD_COLUMNS)} FROM records{where} ORDER BY id",
+                                   self._conn, params=params, index_col='id')
+        df = apply_schema(df)
+        return df if with_ids else df.reset_index(drop=True)
+
+    def update(self, df):
+        """行IDをインデックスにしたデータフレームの内容で、その行だけを書き換える。書き換えた件数を返す"""
+        rows = [[_to_date_text(row[1])] + [_to_sql_value(v) for v in row[2:]] + [int(row[0])]
+                for row in df[RECORD_COLUMNS].itertuples(index=True, name=None)]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"UPDATE records SET {', '.join(f'{col} = ?' for col in RECORD_COLUMNS)} WHERE id = ?", rows)
+            self._conn.execute(BUMP_REVISION_SQL)
+        return len(rows)
+
+    def import_csv(self, file, replace=False):
+        """これまでのCSV（date, day_of_week, weather_category, ...）を取り込む。取り込んだ件数を返す"""
+        return self.import_frame(pd.read_csv(file), replace)
+
+    def import_frame(self, df, replace=False):
+        """データフレームの記録をまとめて追加する。replaceなら全セッションの記録を消してから書き込む。書き込んだ件数を返す"""
+        df = df.copy()
+        missing = [col for col in RECORD_COLUMNS if col not in df.columns]
+        for col in missing:
+            df[col] = None
+        # 内容量が空の行は商品名からまとめて補う
+        if df['volume'].isna().any():
+            df['volume'] = df['volume'].fillna(parse_titles(df['item_name'].fillna('')).set_index(df.index)['volume'])
+        rows = [[_to_date_text(row[0])] + [_to_sql_value(v) for v in row[1:]]
+                for row in df[RECORD_COLUMNS].itertuples(index=False, name=None)]
+        with self._lock, self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM records")
+            self._conn.executemany(
+                f"INSERT INTO records ({', '.join(RECORD_COLUMNS)}) VALUES ({', '.join('?' * len(RECORD_COLUMNS))})",
+                rows)
+            self._conn.execute(BUMP_REVISION_SQL)
+        return len(rows)
@@ -0,0 +1,154 @@
+"""Beer_moneyの記録・集計・描画まわりの処理時間を測るベンチマーク
+
+使い方:
+    python benchmark_beer_money.py --sizes 1000 100000 1000000 --output bench.jsonl
+
+結果は1行1件のJSON（benchmark, rows, seconds, ...）で出力するので、バージョン間で比べられる。
+HTTPは使わず、天気はローカルのスタブから返す。
+"""
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from aggregations import budget_summary, month_summary
+from beer_records import RecordStore
+from record_schema import RECORD_COLUMNS
+from beer_storage import RecordDB
+from chart_render import MonthlyCostChart
+from drinking_score import score_days
+from monthly_aggregates import current_month_number
+from weather_cache import WeatherCache
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+ITEM_NAMES = ['アサヒ スーパードライ 350ml 24本', 'キリン 一番搾り 500ml 24本', 'サッポロ 黒ラベル 350ml 6缶',
+              'サントリー 金麦 350ml 24本×2ケース', 'よなよなエール 350ml 24本']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+WEATHER_DESCRIPTIONS = ['晴れ', '晴れ', '曇り', '小雨', '霧', '小雨', '雨', '雪', '雨', '雷雨']
+
+
+def make_records(rows, years=10, seed=0):
+    """df_recordsと同じ列の合成データを作る（今日までのyears年間に散らばる）"""
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, years * 365, rows))
+    dates = pd.Timestamp(date.today()) - pd.to_timedelta(days[::-1], unit='D')
+    categories = rng.integers(0, 10, rows)
+    return pd.DataFrame({
+        'date': dates,
+        'day_of_week': np.array(DAY_NAMES)[dates.dayofweek],
+        'weather_category': categories,
+        'weather_description': np.array(WEATHER_DESCRIPTIONS)[categories],
+        'temperature_max': rng.normal(20, 8, rows).round(1),
+        'item_name': np.array(ITEM_NAMES)[rng.integers(0, len(ITEM_NAMES), rows)],
+        'price_per_item': rng.uniform(150, 400, rows).round(2),
+        'volume': rng.choice([350, 500], rows),
+    }, columns=RECORD_COLUMNS)
+
+
+def stub_weather_fetcher(latitude, longitude, start_date, end_date):
+    # Open-Meteoの代わりに決まった天気を返す
+    out = {}
+    day = start_date
+    while day <= end_date:
+        out[day.isoformat()] = (day.toordinal() % 10 * 10, 15 + day.toordinal() % 15)
+        day += timedelta(days=1)
+    return out
+
+
+def timed(func, repeat, setup=None):
+    """repeat回実行して一番速い時間（秒）を返す。setupがあればその戻り値をfuncに渡す（時間には含めない）"""
+    best = float('inf')
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(rows, repeat=3, appends=1000):
+    df = make_records(rows)
+    store = RecordStore.from_frame(df)
+    record = df.iloc[-1].to_dict()
+    month = current_month_number()
+    csv_bytes = df.to_csv(index=False).encode('utf-8-sig')
+    results = {}
+
+    def append_path(target):
+        # 「飲んだ！」をappends回（アプリと同じくDBに1行書いてからストアに追加する）
+        s, db = target
+        for _ in range(appends):
+            db.append(record)
+            s.append(record)
+    results['append_per_record'] = timed(
+        append_path, repeat, setup=lambda: (RecordStore.from_frame(df), RecordDB(':memory:'))) / appends
+    results['display_beers_consumed'] = timed(lambda: month_summary(store, month), repeat)
+    results['display_budget_and_beers'] = timed(lambda: budget_summary(store, 5000, month=month), repeat)
+    results['monthly_chart_data'] = timed(store.monthly.price_series, repeat)
+
+    chart = MonthlyCostChart()
+    results['monthly_chart_render'] = timed(lambda: (chart.close(), chart.render(store, 5000)), repeat)
+    results['monthly_chart_budget_only'] = timed(
+        lambda: chart.render(store, 5000 + int(time.perf_counter_ns() % 5000)), repeat)
+    chart.close()
+
+    results['csv_load'] = timed(lambda: RecordStore.from_frame(pd.read_csv(io.BytesIO(csv_bytes))), repeat)
+    results['csv_download'] = timed(lambda: store.to_frame().to_csv(index=False).encode('utf-8-sig'), repeat)
+
+    db = RecordDB(':memory:')
+    results['db_import'] = timed(lambda: db.import_frame(df), 1)
+    results['db_load'] = timed(db.load, repeat)
+    db.close()
+
+    cache = WeatherCache(':memory:', fetcher=stub_weather_fetcher)
+    start = date.today() - timedelta(days=6)
+    results['fetch_weather_week'] = timed(lambda: cache.get_range(35.5206, 139.7172, start, date.today()), repeat)
+    cache.close()
+
+    weather = pd.DataFrame({
+        'date': pd.date_range(end=pd.Timestamp(date.today()), periods=rows),
+        'temperature_max': df['temperature_max'].to_numpy(),
+        'weather_category': df['weather_category'].to_numpy(),
+    })
+    results['determine_drinking_days'] = timed(lambda: score_days(weather), repeat)
+    return results
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='記録の件数')
+    parser.add_argument('--repeat', type=int, default=3, help='各処理の実行回数（一番速い時間を記録）')
+    parser.add_argument('--output', help='結果を追記するJSON Linesファイル（省略時は標準出力）')
+    args = parser.parse_args(argv)
+
+    meta = {'version': git_version(), 'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__}
+    out = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for rows in args.sizes:
+            for name, seconds in run_benchmarks(rows, args.repeat).items():
+                out.write(json.dumps({'benchmark': name, 'rows': rows, 'seconds': seconds, **meta}) + '\n')
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
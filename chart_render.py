@@ -0,0 +1,91 @@
+import io
+from collections import OrderedDict
+
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from aggregations import monthly_price_totals
+
+
+class MonthlyCostChart:
+    """月ごとの金額の棒グラフ
+
+    pyplotのグローバルな図を使わずにFigureを1つだけ持ち、記録が変わったときだけ棒を描き直す。
+    予算だけが変わったときは予算の線を動かすだけにする。描いたPNGは(記録のバージョン, 予算, 種類)で覚えておく。
+    """
+
+    chart_type = 'monthly_cost'
+
+    def __init__(self, max_cached=16):
+        self.max_cached = max_cached
+        self._png_cache = OrderedDict()
+        self._figure = None
+        self._axes = None
+        self._budget_line = None
+        self._drawn_version = None
+        self._max_cost = 0.0
+
+    def _create_figure(self):
+        self._figure = Figure(figsize=(10, 6))
+        FigureCanvasAgg(self._figure)
+        self._axes = self._figure.add_subplot()
+
+    def _draw_bars(self, monthly_price, budget):
+        ax = self._axes
+        ax.clear()
+        ax.bar(monthly_price.index.astype('datetime64[ns]'), monthly_price.values, color='blue', label='Monthly Cost', width=20)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
+        # 月が多いときは目盛りを間引く（目盛りは最大でも24個くらいにする）
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=max(1, -(-len(monthly_price) // 24))))
+        self._budget_line = ax.axhline(y=budget, color='r', linestyle='--', label=f'Budget: ¥{budget}')
+        ax.set_title('Beer Cost')
+        ax.set_xlabel('Month')
+        ax.set_ylabel('Total Cost (JPY)')
+        self._max_cost = float(monthly_price.max()) if len(monthly_price) else 0.0
+        self._set_ylim(budget)
+        ax.grid(axis='y')
+        ax.tick_params(axis='x', labelrotation=45)
+
+    def _move_budget_line(self, budget):
+        self._budget_line.set_ydata([budget, budget])
+        self._budget_line.set_label(f'Budget: ¥{budget}')
+        self._set_ylim(budget)
+
+    def _set_ylim(self, budget):
+        # axhlineは自動の範囲計算に入らないので、棒と予算の大きい方に合わせる
+        self._axes.set_ylim(bottom=0, top=max(self._max_cost, budget) * 1.05 or 1)
+
+    def render(self, records, budget):
+        """PNGのバイト列を返す（同じ記録・同じ予算なら描き直さない）"""
+        key = (records.version, budget, self.chart_type)
+        png = self._png_cache.get(key)
+        if png is not None:
+            self._png_cache.move_to_end(key)
+            return png
+
+        if self._figure is None:
+            self._create_figure()
+        if self._drawn_version != records.version:
+            self._draw_bars(monthly_price_totals(records), budget)
+            self._drawn_version = records.version
+        else:
+            self._move_budget_line(budget)
+        self._axes.legend()  # 凡例を追加
+        self._figure.tight_layout()
+
+        buffer = io.BytesIO()
+        self._figure.savefig(buffer, format='png')
+        png = buffer.getvalue()
+        self._png_cache[key] = png
+        while len(self._png_cache) > self.max_cached:
+            self._png_cache.popitem(last=False)
+        return png
+
+    def close(self):
+        """図とキャッシュを手放す"""
+        if self._figure is not None:
+            self._figure.clear()
+        self._figure = self._axes = self._budget_line = None
+        self._drawn_version = None
+        self._png_cache.clear()
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+# ビール日和の判定ルール
+# relative_window_days: この日数ごとに一番暑い日を◎、一番寒い日を△にする（Noneなら使わない）
+# hot_temperature / cold_temperature: 気温がこれ以上なら◎、これ以下なら△にする（Noneなら使わない）
+# bad_weather_categories: この天気カテゴリの日は1段階下げる
+# bonus_days: この曜日は1段階上げる
+DEFAULT_RULES = {
+    'relative_window_days': 7,
+    'hot_temperature': None,
+    'cold_temperature': None,
+    'bad_weather_categories': [],
+    'bonus_days': [],
+}
+
+# 段階ごとの表示と本数（0: △, 1: 〇, 2: ◎）
+LABELS = np.array(['△', '〇', '◎'])
+NUMBERS = np.array([0, 1, 2])  # △は1本 or 0
+
+
+def score_days(df_weather, rules=None, start_date=None, end_date=None):
+    """天気のデータフレームにdrinking_day（◎/〇/△）とnumber（本数）の列を付けて返す
+
+    期間の長さに制限はなく、ループを使わずに配列の計算だけで判定する。元のデータフレームは変更しない。
+    """
+    rules = {**DEFAULT_RULES, **(rules or {})}
+    df = df_weather
+    dates = pd.to_datetime(df['date'])
+    if start_date is not None or end_date is not None:
+        mask = np.ones(len(df), dtype=bool)
+        if start_date is not None:
+            mask &= (dates >= pd.Timestamp(start_date)).to_numpy()
+        if end_date is not None:
+            mask &= (dates <= pd.Timestamp(end_date)).to_numpy()
+        df, dates = df[mask], dates[mask]
+    df = df.copy()
+
+    temperatures = df['temperature_max'].to_numpy(dtype=np.float64)
+    level = np.ones(len(df), dtype=np.int64)
+
+    window = rules['relative_window_days']
+    if window and len(df):
+        # 期間の最初の日から数えてwindow日ごとに区切り、区切りごとの最高・最低を求める
+        days = ((dates - dates.min()).dt.days // window).to_numpy()
+        grouped = pd.Series(temperatures).groupby(days)
+        block_max = grouped.transform('max').to_numpy()
+        block_min = grouped.transform('min').to_numpy()
+        level = np.where(temperatures == block_min, 0, level)
+        level = np.where(temperatures == block_max, 2, level)
+    if rules['hot_temperature'] is not None:
+        level = np.where(temperatures >= rules['hot_temperature'], 2, level)
+    if rules['cold_temperature'] is not None:
+        level = np.where(temperatures <= rules['cold_temperature'], 0, level)
+
+    if rules['bad_weather_categories'] and 'weather_category' in df.columns:
+        bad = df['weather_category'].isin(rules['bad_weather_categories']).to_numpy()
+        level = level - bad
+    if rules['bonus_days']:
+        day_names = df['day_of_week'] if 'day_of_week' in df.columns else dates.dt.day_name()
+        level = level + day_names.isin(rules['bonus_days']).to_numpy()
+
+    level = np.clip(level, 0, 2)
+    df['drinking_day'] = LABELS[level]
+    df['number'] = NUMBERS[level]
+    return df
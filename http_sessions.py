@@ -0,0 +1,99 @@
+import threading
+
+from instrumentation import note_http_response
+
+
+# 接続先ごとの設定（プールの大きさ・リトライ・キャッシュ）
+HOST_POLICIES = {
+    'open-meteo': {
+        'pool_connections': 2,
+        'pool_maxsize': 10,
+        'retry_total': 5,
+        'backoff_factor': 0.2,
+        'status_forcelist': [500, 502, 503, 504],
+        'cache_name': '.cache',
+        'expire_after': 300,  # キャッシュの有効期限を５分に設定
+    },
+    'rakuten': {
+        'pool_connections': 2,
+        'pool_maxsize': 10,
+        'retry_total': 3,
+        'backoff_factor': 0.5,
+        'status_forcelist': [429, 500, 502, 503, 504],
+        'cache_name': None,
+        'expire_after': None,
+    },
+    'tsukumijima': {
+        'pool_connections': 2,
+        'pool_maxsize': 10,
+        'retry_total': 3,
+        'backoff_factor': 0.2,
+        'status_forcelist': [500, 502, 503, 504],
+        'cache_name': None,
+        'expire_after': None,
+    },
+}
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def _requests_cache():
+    try:
+        import requests_cache  # あればレスポンスをSQLiteにキャッシュする
+    except ImportError:
+        return None
+    return requests_cache
+
+
+def configure(name, **policy):
+    """接続先の設定を変更する（次にget_sessionしたときから反映）"""
+    with _lock:
+        HOST_POLICIES.setdefault(name, dict(HOST_POLICIES['tsukumijima'])).update(policy)
+        old = _sessions.pop(name, None)
+    if old is not None:
+        old.close()
+
+
+def _build_session(policy):
+    # requests・urllib3は最初のセッションを作るときに読み込む（起動を軽くするため）
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.util.retry import Retry
+
+    if policy.get('cache_name') and _requests_cache() is not None:
+        session = _requests_cache().CachedSession(policy['cache_name'], expire_after=policy.get('expire_after'))
+    else:
+        session = requests.Session()
+    # リトライし尽くしても例外にせず最後のレスポンスを返す（429/5xxの表示・ネガティブキャッシュ・遮断で使う）
+    retries = Retry(total=policy['retry_total'], backoff_factor=policy['backoff_factor'],
+                    status_forcelist=policy['status_forcelist'], raise_on_status=False)
+    # 同じ接続を使い回せるように、プール付きのアダプタを1回だけマウントする
+    adapter = HTTPAdapter(pool_connections=policy['pool_connections'], pool_maxsize=policy['pool_maxsize'],
+                          max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    # 受信バイト数やキャッシュのヒットを計測に残す
+    session.hooks['response'].append(note_http_response)
+    return session
+
+
+def get_session(name):
+    """接続先ごとのセッションを返す（プロセス内で1つを共有し、再実行やユーザーをまたいで使い回す）"""
+    session = _sessions.get(name)
+    if session is None:
+        with _lock:
+            session = _sessions.get(name)
+            if session is None:
+                session = _build_session(HOST_POLICIES[name])
+                _sessions[name] = session
+    return session
+
+
+def close_all():
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
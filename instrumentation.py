@@ -0,0 +1,113 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+
+# 段階ごとに覚えておく直近の処理時間の数（p50/p95の計算用）
+HISTORY_SIZE = 200
+
+_current_run = contextvars.ContextVar('current_run', default=None)
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+
+_history = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+_history_lock = threading.Lock()
+
+
+class Run:
+    """1回の再実行で計測した段階ごとの記録"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.stages = []  # {'stage', 'seconds', 'http_bytes', 'cache_hits', 'cache_misses'}
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        with self._lock:
+            self.stages.append(entry)
+
+    def to_dict(self):
+        return {'started_at': self.started_at, 'stages': list(self.stages)}
+
+
+def start_run():
+    """再実行の最初に呼ぶ"""
+    run = Run()
+    _current_run.set(run)
+    return run
+
+
+def current_run():
+    return _current_run.get()
+
+
+class stage:
+    """処理時間・HTTPの受信バイト数・キャッシュのヒット/ミスを記録するコンテキストマネージャ"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.entry = {'stage': self.name, 'seconds': 0.0, 'http_bytes': 0, 'cache_hits': 0, 'cache_misses': 0}
+        self._token = _current_stage.set(self.entry)
+        self._start = time.perf_counter()
+        return self.entry
+
+    def __exit__(self, exc_type, exc, tb):
+        self.entry['seconds'] = time.perf_counter() - self._start
+        _current_stage.reset(self._token)
+        run = _current_run.get()
+        if run is not None:
+            run.add(self.entry)
+        with _history_lock:
+            _history[self.name].append(self.entry['seconds'])
+        return False
+
+
+def instrument(name=None):
+    """関数の呼び出しを1つの段階として記録するデコレータ"""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def note_http_response(response, *args, **kwargs):
+    """requestsのレスポンスフック。受信バイト数とrequests_cacheのヒットを今の段階に加える"""
+    entry = _current_stage.get()
+    if entry is not None:
+        entry['http_bytes'] += len(response.content or b'')
+        if getattr(response, 'from_cache', False):
+            entry['cache_hits'] += 1
+    return response
+
+
+def note_cache(hit):
+    """自前のキャッシュ（天気・楽天）のヒット/ミスを今の段階に加える"""
+    entry = _current_stage.get()
+    if entry is not None:
+        entry['cache_hits' if hit else 'cache_misses'] += 1
+
+
+def percentiles():
+    """段階ごとの直近の処理時間のp50/p95（秒）"""
+    with _history_lock:
+        history = {name: np.array(values) for name, values in _history.items() if values}
+    return {name: {'count': len(values), 'p50': float(np.percentile(values, 50)),
+                   'p95': float(np.percentile(values, 95))}
+            for name, values in history.items()}
+
+
+def export_jsonl(run, path):
+    """1回分の記録をJSON Linesのファイルに追記する"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run.to_dict(), ensure_ascii=False) + '\n')
@@ -0,0 +1,46 @@
+import importlib
+import threading
+import time
+import types
+
+
+# 読み込んだモジュール名 -> 読み込みにかかった秒数
+_import_times = {}
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """属性に初めて触れたときに本物のモジュールを読み込む代理オブジェクト"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    _import_times[self.__name__] = time.perf_counter() - start
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_module(name):
+    """使うまで読み込まないモジュールを返す（例: plt = lazy_module('matplotlib.pyplot')）"""
+    return LazyModule(name)
+
+
+def import_report():
+    """遅延読み込みしたモジュールと、読み込みにかかった秒数"""
+    with _lock:
+        return dict(_import_times)
@@ -0,0 +1,76 @@
+"""Open-Meteoと楽天の商品検索のふりをするローカルのHTTPサーバー
+
+記録したフィクスチャ（providers.ReplayProvider）から返すので、ネットワーク無しでアプリや負荷テストを動かせる。
+
+    python mock_server.py --port 8765 --fixtures fixtures/beer_money.json
+    BEER_MONEY_PROVIDER=mock streamlit run Beer_money4-7.py
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from providers import DEFAULT_FIXTURE_PATH, ENDPOINTS, ReplayProvider
+
+
+# URLのパス -> 取得元の種類
+ROUTES = {'/' + url.split('/', 3)[3]: endpoint for endpoint, (_, url) in ENDPOINTS.items()}
+
+
+def make_handler(provider):
+    class MockHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            endpoint = ROUTES.get(parts.path)
+            if endpoint is None:
+                self._send(404, 'text/plain', b'not found')
+                return
+            # 同じ名前が複数あるパラメータ（daily=...&daily=...）はリストにする
+            params = {key: values if len(values) > 1 else values[0]
+                      for key, values in parse_qs(parts.query).items()}
+            response = provider.fetch(endpoint, params)
+            if response.status_code == 200:
+                body = json.dumps(response.data, ensure_ascii=False).encode('utf-8')
+                self._send(200, 'application/json', body)
+            else:
+                self._send(response.status_code, 'text/plain; charset=utf-8', response.text.encode('utf-8'))
+
+        def _send(self, status_code, content_type, body):
+            self.send_response(status_code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # 負荷テストのときにログで遅くならないように出さない
+
+    return MockHandler
+
+
+def start_mock_server(provider=None, host='127.0.0.1', port=0):
+    """別スレッドでモックサーバーを起動し、(サーバー, ベースURL)を返す。止めるときはserver.shutdown()"""
+    provider = ReplayProvider() if provider is None else provider
+    server = ThreadingHTTPServer((host, port), make_handler(provider))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Open-Meteo・楽天APIのモックサーバー')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURE_PATH, help='記録したフィクスチャのJSONファイル')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(ReplayProvider(args.fixtures)))
+    print(f'mock server: http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+def month_number(year, month):
+    """1970年1月からの月数（datetime64[M]と同じ数え方）"""
+    return (year - 1970) * 12 + (month - 1)
+
+
+def current_month_number():
+    today = date.today()
+    return month_number(today.year, today.month)
+
+
+def days_to_months(days):
+    """1970-01-01からの日数の配列を月数の配列に変換"""
+    return np.asarray(days).view('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+class MonthlyAggregates:
+    """月ごとの本数・金額・内容量の合計を、追加・削除のたびに更新して保持する"""
+
+    def __init__(self):
+        # 月数 -> [本数, price_per_itemの合計, volumeの合計]
+        self._totals = {}
+
+    def _apply(self, months, prices, volumes, sign):
+        df = pd.DataFrame({'month': months, 'price': prices, 'volume': volumes})
+        grouped = df.groupby('month').agg(count=('month', 'size'), price=('price', 'sum'), volume=('volume', 'sum'))
+        for month, count, price, volume in grouped.itertuples(name=None):
+            totals = self._totals.setdefault(month, [0, 0.0, 0.0])
+            totals[0] += sign * int(count)
+            totals[1] += sign * float(price)
+            totals[2] += sign * float(volume)
+            if totals[0] <= 0:
+                del self._totals[month]
+
+    def add(self, day, price, volume):
+        """1件分を加える（dayは1970-01-01からの日数）"""
+        self._update_one(day, price, volume, 1)
+
+    def remove(self, day, price, volume):
+        """1件分を引く（「間違えた！」で消した記録）"""
+        self._update_one(day, price, volume, -1)
+
+    def _update_one(self, day, price, volume, sign):
+        if day == np.iinfo(np.int64).min:  # 日付のない記録は月に数えない
+            return
+        month = int(days_to_months(np.array([day], dtype=np.int64))[0])
+        totals = self._totals.setdefault(month, [0, 0.0, 0.0])
+        totals[0] += sign
+        totals[1] += sign * (0.0 if np.isnan(price) else float(price))
+        totals[2] += sign * (0.0 if np.isnan(volume) else float(volume))
+        if totals[0] <= 0:
+            del self._totals[month]
+
+    def add_many(self, days, prices, volumes):
+        """まとめて加える（CSVの読み込み時など）"""
+        days = np.asarray(days)
+        valid = days != np.iinfo(np.int64).min
+        if valid.any():
+            self._apply(days_to_months(days[valid]), np.asarray(prices)[valid], np.asarray(volumes)[valid], 1)
+
+    def clear(self):
+        self._totals.clear()
+
+    def count(self, month):
+        return self._totals.get(month, (0, 0.0, 0.0))[0]
+
+    def price_sum(self, month):
+        return self._totals.get(month, (0, 0.0, 0.0))[1]
+
+    def volume_sum(self, month):
+        return self._totals.get(month, (0, 0.0, 0.0))[2]
+
+    def price_series(self):
+        """グラフ用：月の初日をインデックスにした月ごとの金額"""
+        months = sorted(self._totals)
+        index = pd.DatetimeIndex(np.array(months, dtype=np.int64).view('datetime64[M]').astype('datetime64[ns]'))
+        return pd.Series([self._totals[m][1] for m in months], index=index, dtype=np.float64)
@@ -0,0 +1,192 @@
+import sqlite3
+import threading
+from datetime import date as date_type
+
+import numpy as np
+
+from aggregations import DEFAULT_PRICE_TIERS
+from rakuten_cache import cached_search, normalize_keyword
+
+
+# 価格カタログを保存するSQLiteファイル
+CATALOG_DB_PATH = 'price_catalog.db'
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS prices (
+    brand TEXT,
+    size_ml INTEGER,
+    price_per_item REAL,
+    effective_date TEXT,
+    source TEXT,
+    PRIMARY KEY (brand, size_ml, effective_date)
+)
+"""
+
+# 内容量を指定しないときの大きさ（ml）
+DEFAULT_SIZE_ML = 350
+
+# 最初に入れておく価格（銘柄, 内容量, 1本あたりの価格）。楽天から取り直すまではこの価格を使う
+SEED_DATE = '2024-01-01'
+SEED_PRICES = [
+    # Beer_money.pyの銘柄
+    ("スーパードライ", 350, 200), ("一番搾り", 350, 200), ("黒ラベル", 350, 200), ("プレミアムモルツ", 350, 210),
+    ("金麦", 350, 170), ("よなよなエール", 350, 210), ("豊潤", 350, 280), ("オリオン", 350, 200),
+    ("サントリー生ビール", 350, 180), ("マルエフ", 350, 190), ("クラシックラガー", 350, 180),
+    ("本麒麟", 350, 170), ("淡麗", 350, 170),
+    # BEER_TEST1.pyの銘柄
+    ("サッポロビール", 350, 250), ("サッポロビール", 500, 300),
+    ("アサヒビール", 350, 250), ("アサヒビール", 500, 300),
+    ("サントリービール", 350, 250), ("サントリービール", 500, 300),
+    ("キリンービール", 350, 250), ("キリンービール", 500, 300),
+] + [(tier, DEFAULT_SIZE_ML, price) for tier, price in DEFAULT_PRICE_TIERS.items()]  # 予算の計算に使う価格帯
+
+# 楽天から取り直す間隔（秒）
+REFRESH_INTERVAL = 24 * 60 * 60
+
+
+def _key(brand, size_ml):
+    return normalize_keyword(brand), int(DEFAULT_SIZE_ML if size_ml is None else size_ml)
+
+
+def rakuten_price(items, size_ml):
+    """楽天の検索結果から、内容量がsize_mlの商品の1本あたりの価格（中央値）を返す。無ければNone"""
+    # rakuten_searchはpandasを使うので、取り直すときに初めて読み込む
+    from rakuten_search import price_candidates
+    candidates = price_candidates(items)
+    prices = candidates['price_per_item'][candidates['volume'] == size_ml].to_numpy(dtype=np.float64)
+    prices = prices[~np.isnan(prices)]
+    if prices.size == 0:
+        return None
+    # 一番安い商品は本数の読み違いのことがあるので、中央値を使う
+    return round(float(np.median(prices)), 1)
+
+
+class PriceCatalog:
+    """銘柄・内容量ごとの1本あたりの価格を、適用開始日つきで保存するカタログ
+
+    今日の価格はメモリの辞書に入れておき、priceは辞書を1回引くだけで返す（HTTPもSQLも使わない）。
+    楽天からの取り直しはrefresh_from_rakutenでまとめて行い、書き込みは1回のexecutemanyで済ませる。
+    """
+
+    def __init__(self, path=CATALOG_DB_PATH, seed=SEED_PRICES):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(CREATE_TABLE_SQL)
+        self._names = {}
+        self._current = {}
+        self._refresh_thread = None
+        self._stop = threading.Event()
+        self.upsert([(brand, size, price, SEED_DATE) for brand, size, price in seed], source='seed', replace=False)
+
+    def close(self):
+        self._stop.set()
+        self._conn.close()
+
+    def upsert(self, rows, source='manual', replace=True):
+        """(銘柄, 内容量, 1本あたりの価格, 適用開始日)の行をまとめて書き込み、今日の価格を読み直す"""
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        values = [(*_key(brand, size), float(price), str(effective_date), source)
+                  for brand, size, price, effective_date in rows]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(f"{verb} INTO prices VALUES (?, ?, ?, ?, ?)", values)
+            # 表示用に、最初に登録したときの銘柄名を覚えておく
+            for brand, size, _, _ in rows:
+                self._names.setdefault(_key(brand, size), (brand, int(size)))
+        self._load_current()
+
+    def _load_current(self, today=None):
+        today = (today or date_type.today()).isoformat()
+        with self._lock:
+            # 銘柄・内容量ごとに、今日までに始まった一番新しい価格（SQLiteはMAXと同じ行の列を返す）
+            rows = self._conn.execute(
+                "SELECT brand, size_ml, price_per_item, MAX(effective_date) FROM prices "
+                "WHERE effective_date <= ? GROUP BY brand, size_ml", (today,)).fetchall()
+        # 辞書ごと置き換えるので、読む側はロック無しで引ける
+        self._current = {(brand, size): (price, effective_date) for brand, size, price, effective_date in rows}
+
+    def price(self, brand, size_ml=None, default=None):
+        """今日の1本あたりの価格"""
+        entry = self._current.get(_key(brand, size_ml))
+        return default if entry is None else entry[0]
+
+    def price_on(self, brand, size_ml, day):
+        """指定した日の1本あたりの価格（その日までに始まった一番新しい価格）"""
+        brand, size_ml = _key(brand, size_ml)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT price_per_item FROM prices WHERE brand = ? AND size_ml = ? AND effective_date <= ? "
+                "ORDER BY effective_date DESC LIMIT 1", (brand, size_ml, str(day))).fetchone()
+        return None if row is None else row[0]
+
+    def entries(self):
+        """登録されている(銘柄, 内容量)の一覧（登録した順）"""
+        return [name for key, name in self._names.items() if key in self._current]
+
+    def brand_prices(self, size_ml=DEFAULT_SIZE_ML, brands=None):
+        """{銘柄: 今日の価格}（Beer_money.pyのbeer_brandsの代わり）"""
+        brands = [brand for brand, size in self.entries() if size == size_ml] if brands is None else brands
+        return {brand: self.price(brand, size_ml) for brand in brands}
+
+    def tier_prices(self):
+        """予算から何本飲めるかの計算に使う{価格帯: 今日の価格}"""
+        return {tier: self.price(tier, DEFAULT_SIZE_ML, price) for tier, price in DEFAULT_PRICE_TIERS.items()}
+
+    def refresh_from_rakuten(self, fetch_page, ngkeyword='', **params):
+        """全部の銘柄を楽天で検索し、見つかった価格を今日からの価格としてまとめて書き込む。更新した件数を返す
+
+        fetch_page(keyword, ngkeyword, **params)はSearchResultを返す関数（rakuten_search.fetch_search_pageなど）。
+        """
+        today = date_type.today().isoformat()
+        rows = []
+        for brand, size_ml in self.entries():
+            result = cached_search(f'{brand} {size_ml}ml', ngkeyword, fetch_page, **params)
+            if result.status_code != 200 or not result.items:
+                continue
+            price = rakuten_price(result.items, size_ml)
+            if price is not None:
+                rows.append((brand, size_ml, price, today))
+        if rows:
+            self.upsert(rows, source='rakuten')
+        return len(rows)
+
+    def last_refreshed(self):
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(effective_date) FROM prices WHERE source = 'rakuten'").fetchone()
+        return row[0]
+
+    def start_background_refresh(self, fetch_page, ngkeyword='', interval=REFRESH_INTERVAL, **params):
+        """別スレッドでinterval秒ごとに楽天から取り直す（今日すでに取り直していれば次の回まで待つ）"""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return self._refresh_thread
+
+        def loop():
+            while not self._stop.is_set():
+                if self.last_refreshed() != date_type.today().isoformat():
+                    try:
+                        self.refresh_from_rakuten(fetch_page, ngkeyword, **params)
+                    except Exception:
+                        pass  # 取り直せなくても今の価格のまま使える。次の回にまた試す
+                else:
+                    # 日付が変わったときに今日の価格を読み直す
+                    self._load_current()
+                self._stop.wait(interval)
+
+        self._refresh_thread = threading.Thread(target=loop, name='price-catalog-refresh', daemon=True)
+        self._refresh_thread.start()
+        return self._refresh_thread
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """プロセスで共有する価格カタログ"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = PriceCatalog()
+        return _catalog
@@ -0,0 +1,282 @@
+import json
+import math
+import os
+import threading
+import zlib
+from collections import namedtuple
+from datetime import date as date_type, timedelta
+
+from lazy_import import lazy_module
+from rakuten_cache import SearchResult
+from request_layer import FAILURE_STATUSES, CircuitOpenError, shared_get
+
+requests = lazy_module('requests')  # 例外の型を見るときだけ読み込む
+
+
+# 取得元の種類（endpoint）ごとの(接続先の名前, URL)
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+REQUEST_URL = 'https://app.rakuten.co.jp/services/api/IchibaItem/Search/20170706'
+
+ENDPOINTS = {
+    'forecast': ('open-meteo', FORECAST_URL),
+    'archive': ('open-meteo', ARCHIVE_URL),
+    'item_search': ('rakuten', REQUEST_URL),
+}
+WEATHER_ENDPOINTS = ('forecast', 'archive')
+
+# 取得元は環境変数で切り替える
+#   live          … 本物のAPI（既定）
+#   offline-first … 本物のAPIの結果をフィクスチャに記録し、つながらないときは記録から返す
+#   replay        … 記録したフィクスチャだけを使う（ネットワークに出ない）
+#   mock          … ローカルのモックサーバー（mock_server.py）に問い合わせる
+PROVIDER_ENV = 'BEER_MONEY_PROVIDER'
+FIXTURE_PATH_ENV = 'BEER_MONEY_FIXTURES'
+MOCK_URL_ENV = 'BEER_MONEY_MOCK_URL'
+DEFAULT_FIXTURE_PATH = os.path.join('fixtures', 'beer_money.json')
+DEFAULT_MOCK_URL = 'http://127.0.0.1:8765'
+
+# 取得結果（dataは200のときのJSON、textはそれ以外のときの本文、replayedは本物のAPIの代わりに記録から返したか）
+ProviderResponse = namedtuple('ProviderResponse', ['status_code', 'data', 'text', 'replayed'], defaults=(False,))
+
+
+class ProviderError(Exception):
+    """取得元が200以外を返したときの例外"""
+
+
+def fixture_key(params):
+    """リクエストのパラメータをフィクスチャのキーにする（アプリIDは含めない）"""
+    items = []
+    for key, value in sorted((params or {}).items()):
+        if key == 'applicationId':
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ','.join(str(v) for v in value)
+        items.append(f'{key}={value}')
+    return '&'.join(items)
+
+
+def _location_key(params):
+    return f"{float(params['latitude']):.4f},{float(params['longitude']):.4f}"
+
+
+def _days(start, end):
+    start, end = date_type.fromisoformat(str(start)), date_type.fromisoformat(str(end))
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def synthetic_weather(location, day):
+    """記録が無い日の天気を、場所と日付から毎回同じ値になるように作る（(天気コード, 最高気温)）"""
+    seed = zlib.crc32(f'{location},{day}'.encode())
+    day_of_year = date_type.fromisoformat(day).timetuple().tm_yday
+    # 夏に高く冬に低い気温に、日ごとのゆらぎを足す
+    temperature = 17 + 10 * math.sin(2 * math.pi * (day_of_year - 110) / 365) + (seed % 60) / 10 - 3
+    codes = [0, 1, 2, 3, 45, 51, 61, 63, 71, 80, 95]
+    return codes[(seed >> 8) % len(codes)], round(temperature, 1)
+
+
+class LiveProvider:
+    """本物のAPI（またはbase_urlで指定したモックサーバー）から取得する"""
+
+    def __init__(self, base_url=None, timeout=10):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def url(self, endpoint):
+        name, url = ENDPOINTS[endpoint]
+        if self.base_url is None:
+            return url
+        # モックサーバーには本物と同じパスで問い合わせる
+        return self.base_url.rstrip('/') + '/' + url.split('/', 3)[3]
+
+    def fetch(self, endpoint, params):
+        name, _ = ENDPOINTS[endpoint]
+        # 流量制限・同じリクエストのまとめ・遮断はrequest_layerで行う
+        try:
+            response = shared_get(name, self.url(endpoint), params, timeout=self.timeout)
+        except CircuitOpenError as exc:
+            # 遮断中は503が返ったのと同じに扱う（呼び出し元はProviderErrorやSearchResultで受け取る）
+            return ProviderResponse(503, None, str(exc))
+        if response.status_code == 200:
+            return ProviderResponse(200, response.json(), '')
+        return ProviderResponse(response.status_code, None, response.text)
+
+
+class ReplayProvider:
+    """フィクスチャ（JSONファイル）に記録した結果を返す。ネットワークには出ない
+
+    天気は日ごとに記録する。synthesizeがTrueなら記録が無い日はsynthetic_weatherの値で埋め、
+    Falseなら記録がある日だけを返す（1日も無ければ404）。
+    商品検索は同じパラメータの記録だけを返し、無ければ404にする。
+    """
+
+    def __init__(self, path=DEFAULT_FIXTURE_PATH, synthesize=True):
+        self.path = path
+        self.synthesize = synthesize
+        self._lock = threading.Lock()
+        self._fixtures = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                fixtures = json.load(f)
+        except FileNotFoundError:
+            fixtures = {}
+        fixtures.setdefault('weather', {})
+        fixtures.setdefault('item_search', {})
+        return fixtures
+
+    def save(self):
+        """フィクスチャをファイルに書き出す（書きかけのファイルが残らないように置き換える）"""
+        with self._lock:
+            text = json.dumps(self._fixtures, ensure_ascii=False, indent=1, sort_keys=True)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+
+    def record(self, endpoint, params, response):
+        """取得結果をフィクスチャに追加する（保存はsaveで行う）"""
+        with self._lock:
+            if endpoint in WEATHER_ENDPOINTS:
+                if response.status_code != 200:
+                    return
+                daily = response.data['daily']
+                days = self._fixtures['weather'].setdefault(_location_key(params), {})
+                for day, code, temp in zip(daily['time'], daily['weather_code'], daily['temperature_2m_max']):
+                    days[day] = [code, temp]
+            else:
+                self._fixtures['item_search'][fixture_key(params)] = {
+                    'status_code': response.status_code,
+                    'data': response.data,
+                    'text': response.text,
+                }
+
+    def fetch(self, endpoint, params):
+        if endpoint in WEATHER_ENDPOINTS:
+            location = _location_key(params)
+            days = _days(params['start_date'], params['end_date'])
+            with self._lock:
+                recorded = dict(self._fixtures['weather'].get(location, {}))
+            if self.synthesize:
+                values = [recorded.get(day) or synthetic_weather(location, day) for day in days]
+            else:
+                # 作った値は返さない（本物のAPIの代わりに使うときは記録がある日だけ）
+                days = [day for day in days if day in recorded]
+                values = [recorded[day] for day in days]
+                if not days:
+                    return ProviderResponse(404, None, 'no recorded weather', True)
+            return ProviderResponse(200, {'daily': {
+                'time': days,
+                'weather_code': [value[0] for value in values],
+                'temperature_2m_max': [value[1] for value in values],
+            }}, '', True)
+        with self._lock:
+            entry = self._fixtures['item_search'].get(fixture_key(params))
+        if entry is None:
+            return ProviderResponse(404, None, 'no recorded response', True)
+        return ProviderResponse(entry['status_code'], entry['data'], entry['text'], True)
+
+
+class RecordingProvider:
+    """取得元innerの結果をreplayのフィクスチャに記録しながら返す"""
+
+    def __init__(self, inner, replay):
+        self.inner = inner
+        self.replay = replay
+
+    def fetch(self, endpoint, params):
+        response = self.inner.fetch(endpoint, params)
+        if response.status_code == 200:
+            self.replay.record(endpoint, params, response)
+            self.replay.save()
+        return response
+
+
+class FallbackProvider:
+    """primaryにつながらない・429/5xxが返るときはfallbackの結果を返す（replayedをTrueにして返す）"""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def fetch(self, endpoint, params):
+        try:
+            response = self.primary.fetch(endpoint, params)
+        except Exception:
+            # 接続エラー・タイムアウト・遮断中（CircuitOpenError）はどれも記録から返す
+            return self.fallback.fetch(endpoint, params)._replace(replayed=True)
+        if response.status_code in FAILURE_STATUSES:
+            fallback = self.fallback.fetch(endpoint, params)
+            if fallback.status_code == 200:
+                return fallback._replace(replayed=True)
+        return response
+
+
+def make_provider(mode='live', fixture_path=DEFAULT_FIXTURE_PATH, mock_url=DEFAULT_MOCK_URL):
+    """modeに合わせた取得元を作る"""
+    if mode == 'live':
+        return LiveProvider()
+    if mode == 'replay':
+        return ReplayProvider(fixture_path)
+    if mode == 'mock':
+        return LiveProvider(base_url=mock_url)
+    if mode == 'offline-first':
+        # 本物のAPIの代わりに作った天気を返さない（記録がある日だけ）
+        replay = ReplayProvider(fixture_path, synthesize=False)
+        return FallbackProvider(RecordingProvider(LiveProvider(), replay), replay)
+    raise ValueError(f'unknown provider mode: {mode}')
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """プロセスで共有する取得元（環境変数BEER_MONEY_PROVIDERで選ぶ）"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = make_provider(
+                os.getenv(PROVIDER_ENV, 'live'),
+                os.getenv(FIXTURE_PATH_ENV, DEFAULT_FIXTURE_PATH),
+                os.getenv(MOCK_URL_ENV, DEFAULT_MOCK_URL),
+            )
+        return _provider
+
+
+def set_provider(provider):
+    """取得元を差し替える（負荷テストなどで使う）。Noneなら次の呼び出しで環境変数から作り直す"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+def fetch_response(endpoint, params):
+    """共有の取得元から200の取得結果を取得する（それ以外はProviderError）"""
+    response = get_provider().fetch(endpoint, params)
+    if response.status_code != 200:
+        raise ProviderError(f'{endpoint}: HTTP {response.status_code} {response.text[:200]}')
+    return response
+
+
+def fetch_json(endpoint, params):
+    """共有の取得元から200のJSONを取得する（それ以外はProviderError）"""
+    return fetch_response(endpoint, params).data
+
+
+def search_items(params):
+    """共有の取得元で楽天の商品検索を行い、SearchResultで返す"""
+    try:
+        response = get_provider().fetch('item_search', params)
+    except CircuitOpenError as exc:
+        return SearchResult(503, [], str(exc))
+    except requests.RequestException as exc:
+        # 接続エラー・タイムアウトも遮断中と同じく503として返す
+        return SearchResult(503, [], str(exc))
+    if response.status_code == 200:
+        return SearchResult(200, response.data.get('Items', []), '')
+    return SearchResult(response.status_code, [], response.text)
@@ -0,0 +1,83 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+from instrumentation import note_cache
+
+
+# 検索結果（status_codeが200以外やitemsが空のときも結果としてキャッシュする）
+SearchResult = namedtuple('SearchResult', ['status_code', 'items', 'text'])
+
+_whitespace_pattern = re.compile(r'\s+')
+
+
+def normalize_keyword(keyword):
+    """全角・半角をそろえ、空白をまとめたキーワードを返す"""
+    if keyword is None:
+        return ''
+    # NFKCで全角英数字・全角スペースを半角に、半角カナを全角にそろえる
+    keyword = unicodedata.normalize('NFKC', keyword)
+    return _whitespace_pattern.sub(' ', keyword).strip().lower()
+
+
+class SearchCache:
+    """楽天の検索結果をキーワードごとに保持するLRUキャッシュ（TTL・ネガティブキャッシュ付き）"""
+
+    def __init__(self, maxsize=256, ttl=60 * 60, negative_ttl=5 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl  # 結果なし・エラーは短めに覚えておく
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(keyword, ngkeyword, params=None):
+        # page・sortなどの追加のパラメータもキーに含める
+        return normalize_keyword(keyword), normalize_keyword(ngkeyword), tuple(sorted((params or {}).items()))
+
+    def get(self, keyword, ngkeyword, params=None):
+        """キャッシュにあればSearchResult、無いか期限切れならNoneを返す"""
+        key = self.make_key(keyword, ngkeyword, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, keyword, ngkeyword, result, params=None):
+        negative = result.status_code != 200 or not result.items
+        expires_at = time.monotonic() + (self.negative_ttl if negative else self.ttl)
+        key = self.make_key(keyword, ngkeyword, params)
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# プロセス内で共有するキャッシュ（複数のユーザーが同じ銘柄を検索しても1回のAPI呼び出しで済む）
+search_cache = SearchCache()
+
+
+def cached_search(keyword, ngkeyword, fetch, **params):
+    """キャッシュを使って検索する。fetch(keyword, ngkeyword, **params)はSearchResultを返す関数"""
+    result = search_cache.get(keyword, ngkeyword, params)
+    note_cache(result is not None)
+    if result is None:
+        result = fetch(keyword, ngkeyword, **params)
+        search_cache.put(keyword, ngkeyword, result, params)
+    return result
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from providers import search_items
+from rakuten_cache import cached_search
+from title_parser import parse_titles
+
+
+# 1回の検索で取りに行く最大のページ数と、1ページの件数（APIの上限は30件）
+MAX_PAGES = 3
+HITS_PER_PAGE = 30
+
+def fetch_search_page(keyword, ngkeyword, app_id, page=1, hits=HITS_PER_PAGE, sort='standard'):
+    """楽天の商品検索の1ページ分を取得する"""
+    params = {
+        'applicationId': app_id,
+        'keyword': keyword,
+        'format': 'json',
+        'NGKeyword': ngkeyword,
+        'page': page,
+        'hits': hits,
+        'sort': sort,
+    }
+    # 取得元（本物のAPI・記録・モックサーバー）はprovidersで切り替える
+    return search_items(params)
+
+
+def price_candidates(items):
+    """検索結果の商品ごとに、数量・内容量と1本あたり・1mlあたりの価格を計算したデータフレーム"""
+    rows = [entry['Item'] for entry in items]
+    if not rows:
+        return pd.DataFrame(columns=['item', 'quantity', 'volume', 'price_per_item', 'price_per_ml'])
+    prices = np.array([row['itemPrice'] for row in rows], dtype=np.float64)
+    parsed = parse_titles([row['itemName'] for row in rows])
+    quantity = parsed['quantity'].to_numpy(dtype=np.float64, na_value=np.nan)
+    volume = parsed['volume'].to_numpy(dtype=np.float64, na_value=np.nan)
+    price_per_item = prices / quantity
+    return pd.DataFrame({
+        'item': rows,
+        'quantity': quantity,
+        'volume': volume,
+        'price_per_item': price_per_item,
+        'price_per_ml': price_per_item / volume,
+    })
+
+
+def stream_candidates(keyword, ngkeyword, app_id, pages=MAX_PAGES, sort='+itemPrice', fetch_page=fetch_search_page):
+    """複数ページを同時に取得し、届いたページから順に候補のデータフレームを返すジェネレータ"""
+    pages = max(1, min(pages, MAX_PAGES))  # 1回の検索のリクエスト数には上限を設ける
+    with ThreadPoolExecutor(max_workers=pages) as executor:
+        futures = [
+            executor.submit(cached_search, keyword, ngkeyword, fetch_page, app_id=app_id, page=page, sort=sort)
+            for page in range(1, pages + 1)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.status_code == 200 and result.items:
+                yield price_candidates(result.items)
+
+
+def best_price_item(keyword, ngkeyword, app_id, by='price_per_item', pages=MAX_PAGES, fetch_page=fetch_search_page,
+                    on_update=None):
+    """1本あたり（by='price_per_ml'なら1mlあたり）が一番安い商品を返す。見つからなければNone
+
+    on_updateを渡すと、ページが届いて一番安い商品が変わるたびにon_update(商品, 価格)を呼ぶ。
+    """
+    best, best_price = None, np.inf
+    for candidates in stream_candidates(keyword, ngkeyword, app_id, pages, fetch_page=fetch_page):
+        prices = candidates[by].to_numpy(dtype=np.float64)
+        if np.isnan(prices).all():
+            continue
+        i = int(np.nanargmin(prices))
+        if prices[i] < best_price:
+            best, best_price = candidates['item'].iloc[i], prices[i]
+            if on_update is not None:
+                on_update(best, best_price)
+    return best
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+
+# 記録データフレームの列（Beer_money4-7.pyのdf_recordsと同じ並び）
+RECORD_COLUMNS = ['date', 'day_of_week', 'weather_category', 'weather_description',
+                  'temperature_max', 'item_name', 'price_per_item', 'volume']
+
+# 同じ文字列が何度も出てくる列はカテゴリにする
+CATEGORY_COLUMNS = ['day_of_week', 'weather_description', 'item_name']
+
+# 数値の列の型（小さい型でメモリを節約する）
+NUMERIC_DTYPES = {
+    'weather_category': np.dtype(np.int8),
+    'temperature_max': np.dtype(np.float32),
+    'price_per_item': np.dtype(np.float32),
+    'volume': np.dtype(np.int16),
+}
+NUMERIC_COLUMNS = list(NUMERIC_DTYPES)
+
+# 整数の列で「値なし」を表す値（天気カテゴリも内容量も0以上なので-1は使われない）
+INT_MISSING = -1
+
+# データフレームにしたときの型（整数の列は欠損を扱えるpandasの整数型にする）
+RECORD_DTYPES = {
+    'date': 'datetime64[s]',
+    'day_of_week': 'category',
+    'weather_category': 'Int8',
+    'weather_description': 'category',
+    'temperature_max': 'float32',
+    'item_name': 'category',
+    'price_per_item': 'float32',
+    'volume': 'Int16',
+}
+
+
+def is_missing(value):
+    return value is None or (not isinstance(value, str) and pd.isna(value))
+
+
+def to_buffer_value(col, value):
+    """1つの値を数値の列のバッファに入れる値に変換"""
+    dtype = NUMERIC_DTYPES[col]
+    if is_missing(value):
+        return np.nan if dtype.kind == 'f' else INT_MISSING
+    return float(value) if dtype.kind == 'f' else int(value)
+
+
+def to_buffer_array(col, values):
+    """Seriesを数値の列のバッファに入れる配列に変換"""
+    dtype = NUMERIC_DTYPES[col]
+    numbers = pd.to_numeric(values, errors='coerce')
+    if dtype.kind == 'f':
+        return numbers.to_numpy(dtype=dtype, na_value=np.nan)
+    numbers = numbers.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isnan(numbers), INT_MISSING, np.nan_to_num(numbers).round()).astype(dtype)
+
+
+def buffer_to_array(col, values):
+    """バッファの数値をデータフレームの列に変換（浮動小数点はそのまま、整数は-1を欠損にする）"""
+    if NUMERIC_DTYPES[col].kind == 'f':
+        return values
+    return pd.arrays.IntegerArray(values, values == INT_MISSING)
+
+
+def as_float(col, value):
+    """バッファの1つの値を集計用のfloatに変換（欠損はnan）"""
+    if NUMERIC_DTYPES[col].kind == 'f':
+        return float(value)
+    return np.nan if value == INT_MISSING else float(value)
+
+
+def apply_schema(df):
+    """記録のデータフレームを決まった型にそろえた新しいデータフレームを返す（元のdfは変更しない）"""
+    data = {}
+    for col in RECORD_COLUMNS:
+        values = df[col] if col in df.columns else pd.Series([None] * len(df), index=df.index)
+        if col == 'date':
+            data[col] = pd.to_datetime(values).astype(RECORD_DTYPES[col])
+        elif col in CATEGORY_COLUMNS:
+            data[col] = values.astype('category')
+        else:
+            data[col] = pd.to_numeric(values, errors='coerce').astype(RECORD_DTYPES[col])
+    return pd.DataFrame(data, index=df.index, columns=RECORD_COLUMNS)
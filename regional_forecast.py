@@ -0,0 +1,112 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from request_layer import shared_get
+
+
+FORECAST_URL = "https://weather.tsukumijima.net/api/forecast/city/{city_code}"
+
+# 気象庁の天気予報は毎日5時・11時・17時（日本時間）に発表される
+JST = timezone(timedelta(hours=9))
+PUBLISH_HOURS = (5, 11, 17)
+# 発表時刻を過ぎてもまだ新しい予報が出ていないときは、この秒数たってから取り直す
+RETRY_SECONDS = 10 * 60
+
+MAX_WORKERS = 8
+
+# 地域ごとの予報（citiesの並びとdatesの日付に合わせた最高気温の配列。予報が無いところはnan。
+# failedは取得できなかった地域名で、その行はすべてnan）
+RegionalForecast = namedtuple('RegionalForecast', ['cities', 'dates', 'temperatures', 'failed'], defaults=((),))
+
+
+def next_publish_time(public_time):
+    """予報の発表時刻public_timeの次の発表時刻"""
+    public_time = public_time.astimezone(JST)
+    for days in (0, 1):
+        day = public_time.date() + timedelta(days=days)
+        for hour in PUBLISH_HOURS:
+            candidate = datetime(day.year, day.month, day.day, hour, tzinfo=JST)
+            if candidate > public_time:
+                return candidate
+
+
+def parse_forecast(data):
+    """APIの応答を{日付: 最高気温}にする（最高気温が無い日はnan）"""
+    temperatures = {}
+    for forecast in data.get('forecasts', []):
+        temperature = (forecast.get('temperature') or {}).get('max') or {}
+        celsius = temperature.get('celsius')
+        temperatures[forecast['date']] = np.nan if celsius is None else float(celsius)
+    return temperatures
+
+
+class ForecastCache:
+    """地域ごとの予報を、次の発表時刻まで覚えておく"""
+
+    def __init__(self, fetch=None, max_workers=MAX_WORKERS):
+        self.fetch = fetch or self._fetch_json
+        self.max_workers = max_workers
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fetch_json(city_code):
+        response = shared_get('tsukumijima', FORECAST_URL.format(city_code=city_code))
+        response.raise_for_status()
+        return response.json()
+
+    def get(self, city_code, now=None):
+        """1つの地域の{日付: 最高気温}（期限内ならキャッシュから返す）"""
+        now = now or datetime.now(JST)
+        with self._lock:
+            entry = self._entries.get(city_code)
+        if entry is not None and now < entry[0]:
+            return entry[1]
+
+        data = self.fetch(city_code)
+        temperatures = parse_forecast(data)
+        expires_at = now + timedelta(seconds=RETRY_SECONDS)
+        if data.get('publicTime'):
+            expires_at = max(next_publish_time(datetime.fromisoformat(data['publicTime'])), expires_at)
+        with self._lock:
+            self._entries[city_code] = (expires_at, temperatures)
+        return temperatures
+
+    def _get_or_none(self, city_code):
+        # 1つの地域の失敗（HTTPエラー・遮断中など）で全地域の表が出せなくならないようにする
+        try:
+            return self.get(city_code)
+        except Exception:
+            return None
+
+    def get_many(self, city_codes):
+        """複数の地域を同時に取得し、{地域コード: {日付: 最高気温}}を返す（取得できなかった地域はNone）"""
+        city_codes = list(city_codes)
+        if len(city_codes) <= 1:
+            return {code: self._get_or_none(code) for code in city_codes}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(city_codes))) as executor:
+            return dict(zip(city_codes, executor.map(self._get_or_none, city_codes)))
+
+    def combined(self, cities):
+        """{地域名: 地域コード}の全地域の予報を1つの配列にまとめたRegionalForecast"""
+        fetched = self.get_many(cities.values())
+        failed = tuple(name for name, code in cities.items() if fetched[code] is None)
+        forecasts = {code: temperatures or {} for code, temperatures in fetched.items()}
+        dates = sorted({day for temperatures in forecasts.values() for day in temperatures})
+        table = np.full((len(cities), len(dates)), np.nan)
+        for i, code in enumerate(cities.values()):
+            for j, day in enumerate(dates):
+                table[i, j] = forecasts[code].get(day, np.nan)
+        return RegionalForecast(list(cities), dates, table, failed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# プロセス内で共有するキャッシュ
+forecast_cache = ForecastCache()
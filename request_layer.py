@@ -0,0 +1,139 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from http_sessions import get_session
+
+
+# 接続先ごとの流量制限（1秒あたりのリクエスト数, 連続して送れる最大数）
+RATE_LIMITS = {
+    'open-meteo': (5.0, 10),
+    'rakuten': (1.0, 1),  # 楽天APIは1秒に1回まで
+    'tsukumijima': (5.0, 10),  # 全地域の予報をまとめて取りに行くので多めに送れるようにする
+}
+
+# この回数続けて429/5xxが返ったら、RESET_TIMEOUT秒のあいだリクエストを止める
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+FAILURE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """接続先が続けて失敗しているので、リクエストを送らずに止めたときの例外"""
+
+
+class TokenBucket:
+    """トークンバケット方式の流量制限（足りなければトークンがたまるまで待つ）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            # 待つ分を先に引いておくので、ロックを外して待っても順番は守られる
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """429/5xxが続いた接続先へのリクエストをしばらく止める"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_request(self, name):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                raise CircuitOpenError(f'{name}: upstream is failing, requests are paused')
+            # 止めてからreset_timeout秒たったら、1つだけ試しに通す
+            self._trial_running = True
+
+    def after_response(self, status_code):
+        with self._lock:
+            self._trial_running = False
+            if status_code in FAILURE_STATUSES:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+            else:
+                self._failures = 0
+                self._opened_at = None
+
+    def after_error(self):
+        self.after_response(503)
+
+
+_buckets = {}
+_breakers = {}
+_in_flight = {}
+_lock = threading.Lock()
+
+
+def _bucket(name):
+    with _lock:
+        if name not in _buckets:
+            rate, capacity = RATE_LIMITS.get(name, (5.0, 5))
+            _buckets[name] = TokenBucket(rate, capacity)
+        return _buckets[name]
+
+
+def breaker(name):
+    with _lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker()
+        return _breakers[name]
+
+
+def _request_key(name, url, params):
+    items = []
+    for key, value in sorted((params or {}).items()):
+        items.append((key, tuple(value) if isinstance(value, list) else value))
+    return name, url, tuple(items)
+
+
+def shared_get(name, url, params=None, timeout=10):
+    """接続先nameへのGET。流量制限と遮断を通し、同時に来た同じリクエストは1回の通信の結果を共有する"""
+    key = _request_key(name, url, params)
+    with _lock:
+        future = _in_flight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _in_flight[key] = future
+    if not owner:
+        return future.result()
+
+    try:
+        circuit = breaker(name)
+        circuit.before_request(name)
+        _bucket(name).acquire()
+        try:
+            response = get_session(name).get(url, params=params, timeout=timeout)
+        except Exception:
+            circuit.after_error()
+            raise
+        circuit.after_response(response.status_code)
+        future.set_result(response)
+        return response
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
@@ -1,5 +1,7 @@
+import numpy as np
+import pandas as pd
 import streamlit as st
-import requests
+from regional_forecast import forecast_cache
 from datetime import datetime
 
 # 地域コードの設定
@@ -9,32 +11,71 @@ city_code_list = {
 }
 
 def get_monthly_temperature_forecast(city_code):
-    """指定された地域コードで今後1ヶ月の気温予測を取得"""
-    url = f"https://weather.tsukumijima.net/api/forecast/city/{city_code}"
-    response = requests.get(url)
-    data = response.json()
-    temperatures = []
-    if 'forecasts' in data:
-        for forecast in data['forecasts']:
-            if 'temperature' in forecast and forecast['temperature']['max'] is not None:
-                temp = forecast['temperature']['max']['celsius']
-                temperatures.append(float(temp))
-    return temperatures
-
-def calculate_monthly_beer_budget(temperatures, price, budget):
+    """指定された地域コードで今後1ヶ月の気温予測を取得（次の発表時刻まではキャッシュから返す。取得できなければ空）"""
+    temperatures = forecast_cache.get_many([city_code])[city_code] or {}
+    return [temp for _, temp in sorted(temperatures.items()) if not np.isnan(temp)]
+
+
+def get_regional_temperature_forecast(cities=None):
+    """全地域の気温予測を同時に取得し、地域×日付の表にする"""
+    forecast = forecast_cache.combined(city_code_list if cities is None else cities)
+    return pd.DataFrame(forecast.temperatures, index=forecast.cities, columns=forecast.dates)
+
+# 気温ごとの飲む量の重み（暑い日は多め、寒い日は少なめ）
+DEFAULT_WEIGHT_RULES = {
+    'hot_temperature': 25,   # これより暑い日は
+    'hot_weight': 1.5,       # 1.5倍
+    'cold_temperature': 15,  # これより寒い日は
+    'cold_weight': 0.5,      # 0.5倍
+    'normal_weight': 1.0,
+}
+
+
+def step_weight_curve(temperatures, rules=None):
+    """暑い日・寒い日・それ以外の3段階の重み"""
+    rules = {**DEFAULT_WEIGHT_RULES, **(rules or {})}
+    temperatures = np.asarray(temperatures, dtype=np.float64)
+    return np.where(temperatures > rules['hot_temperature'], rules['hot_weight'],
+                    np.where(temperatures < rules['cold_temperature'], rules['cold_weight'], rules['normal_weight']))
+
+
+def linear_weight_curve(points, weights):
+    """気温points[i]で重みweights[i]になり、その間は直線で結ぶ重みの関数を返す（範囲の外は端の値）"""
+    def curve(temperatures):
+        return np.interp(np.asarray(temperatures, dtype=np.float64), points, weights)
+    return curve
+
+
+def allocate_scenarios(temperatures, prices, budgets, weight_curve=step_weight_curve):
+    """(価格, 予算)の組ごとに、日ごとのビールの本数をまとめて計算する
+
+    pricesとbudgetsは同じ長さ（どちらかがスカラーでもよい）で、戻り値は(組の数, 日数)の配列。
+    1日あたりの本数は 予算 / 価格 / 日数 × 重み で、累計の金額が予算をちょうど超えないところで打ち切る。
+    """
+    weights = weight_curve(np.asarray(temperatures, dtype=np.float64))
+    prices, budgets = np.broadcast_arrays(np.atleast_1d(np.asarray(prices, dtype=np.float64)),
+                                          np.atleast_1d(np.asarray(budgets, dtype=np.float64)))
+    if weights.size == 0:
+        return np.zeros((prices.size, 0))
+    # 予算で買える本数（価格が0以下の組は0本にする）
+    affordable = np.divide(budgets, prices, out=np.zeros(prices.shape), where=prices > 0)
+    desired = (affordable / weights.size)[:, None] * weights[None, :]
+    # 累計の本数を買える本数で頭打ちにしてから日ごとの差に戻す（超えた日は残りの分だけ、その後は0本）
+    cumulative = np.minimum(np.cumsum(desired, axis=1), affordable[:, None])
+    return np.diff(cumulative, axis=1, prepend=0)
+
+
+def calculate_monthly_beer_budget(temperatures, price, budget, weight_curve=step_weight_curve):
     """気温に基づいて予算内で飲めるビールの本数を計算"""
-    beer_counts = []
-    total_cost = 0
-    for temp in temperatures:
-        if temp > 25:  # 暑い日はビールを多めに
-            beers = budget / price / len(temperatures) * 1.5
-        elif temp < 15:  # 寒い日はビールを少なめに
-            beers = budget / price / len(temperatures) * 0.5
-        else:
-            beers = budget / price / len(temperatures)
-        beer_counts.append(min(beers, (budget - total_cost) / price))
-        total_cost += beers * price
-    return beer_counts
+    return allocate_scenarios(temperatures, price, budget, weight_curve)[0].tolist()
+
+
+def sensitivity_table(temperatures, prices, budgets, weight_curve=step_weight_curve):
+    """価格（行）と予算（列）の組み合わせごとに、期間中に飲める本数の合計の表"""
+    price_grid, budget_grid = np.meshgrid(prices, budgets, indexing='ij')
+    totals = allocate_scenarios(temperatures, price_grid.ravel(), budget_grid.ravel(), weight_curve).sum(axis=1)
+    return pd.DataFrame(totals.reshape(price_grid.shape), index=pd.Index(prices, name='価格（円）'),
+                        columns=pd.Index(budgets, name='予算（円）'))
 
 def main():
     st.title('ビール消費量予測アプリ')
@@ -44,12 +85,22 @@ def main():
     budget = st.number_input("月間ビール予算を入力してください（円）")
 
     if st.button("予測を実行"):
+        # 全地域をまとめて取得しておき、選んだ地域の予報もそこから使う
+        regional = get_regional_temperature_forecast()
+        st.write("地域ごとの最高気温の予測（℃）:")
+        st.dataframe(regional)
         temperatures = get_monthly_temperature_forecast(city_code)
         if temperatures:
             beer_counts = calculate_monthly_beer_budget(temperatures, price, budget)
             st.write("今後の気温予測に基づくビールの消費量（本数）:")
             for day, beers in enumerate(beer_counts):
                 st.write(f"Day {day+1}: 約{beers:.2f}本")
+
+            # 価格と予算を変えたときに飲める本数（すべての組み合わせを1回で計算する）
+            st.write("価格・予算を変えたときの期間中の合計本数:")
+            prices = np.round(price * np.array([0.8, 0.9, 1.0, 1.1, 1.2]))
+            budgets = np.round(budget * np.array([0.5, 0.75, 1.0, 1.25, 1.5]))
+            st.dataframe(sensitivity_table(temperatures, prices, budgets).round(1))
         else:
             st.write("気温情報を取得できませんでした。")
 
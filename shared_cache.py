@@ -0,0 +1,76 @@
+"""ブラウザのセッションをまたいでサーバー全体で共有するキャッシュ（Beer_money4-7.py用）
+
+st.session_stateに置いた結果はセッションごとなので、同じ川崎の予報や同じ楽天の検索をユーザーの数だけ取りに行ってしまう。
+ここの関数はst.cache_data / st.cache_resourceで1つのプロセスの全セッションから共有する。
+キーは日付をISO形式の文字列、キーワードをnormalize_keywordでそろえた文字列にして、表記の違いで別のキーにならないようにする。
+"""
+import streamlit as st
+
+from rakuten_cache import cached_search, normalize_keyword
+from weather_cache import WeatherCache
+
+
+# 天気（予報は数時間ごとに変わるので短め。過去の日はWeatherCacheが確定値として持っている）
+WEATHER_TTL = 10 * 60
+WEATHER_MAX_ENTRIES = 128
+
+# 楽天の検索（結果があったものだけ覚える。結果なし・エラーはrakuten_cacheのネガティブキャッシュに任せる）
+SEARCH_TTL = 60 * 60
+SEARCH_MAX_ENTRIES = 256
+
+# DBから読み込んだ記録（DBが変わるとキーが変わるので、TTLは使わなくなった記録を消すためのもの）
+RECORDS_TTL = 60 * 60
+RECORDS_MAX_ENTRIES = 4
+
+
+class _Uncached(Exception):
+    """キャッシュしたくない結果を返すための例外（st.cache_dataは例外を覚えない）"""
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+
+@st.cache_resource
+def weather_cache():
+    """全セッションで共有する天気のキャッシュ（SQLiteの接続も1つで済む）"""
+    return WeatherCache()
+
+
+@st.cache_data(ttl=WEATHER_TTL, max_entries=WEATHER_MAX_ENTRIES, show_spinner=False)
+def _weather_range(latitude, longitude, start, end):
+    return weather_cache().get_range(latitude, longitude, start, end)
+
+
+def weather_range(latitude, longitude, start_date, end_date):
+    """期間内の天気（date, weather_code, temperature_2m_max）。同じ場所・期間は全セッションで1回だけ取得する"""
+    return _weather_range(round(float(latitude), 4), round(float(longitude), 4),
+                          start_date.isoformat(), end_date.isoformat())
+
+
+@st.cache_data(ttl=SEARCH_TTL, max_entries=SEARCH_MAX_ENTRIES, show_spinner=False)
+def _search(key, ngkey, _keyword, _ngkeyword, _fetch):
+    # キーはそろえた文字列、検索には入力されたままのキーワードを使う
+    result = cached_search(_keyword, _ngkeyword, _fetch)
+    if result.status_code != 200 or not result.items:
+        raise _Uncached(result)
+    return result
+
+
+def search(keyword, ngkeyword, fetch):
+    """楽天の検索結果（SearchResult）。fetch(keyword, ngkeyword)は検索する関数で、キーには含めない"""
+    try:
+        return _search(normalize_keyword(keyword), normalize_keyword(ngkeyword), keyword, ngkeyword, fetch)
+    except _Uncached as exc:
+        return exc.result
+
+
+@st.cache_data(ttl=RECORDS_TTL, max_entries=RECORDS_MAX_ENTRIES, show_spinner=False)
+def _record_frame(path, fingerprint, start, _db):
+    return _db.load(start)
+
+
+def record_frame(db, start_date=None):
+    """DBの記録（start_date以降。省略時は全件）のデータフレーム。DBが変わっていなければ、別のセッションが読み込んだものを使い回す"""
+    start = None if start_date is None else start_date.isoformat()
+    return _record_frame(db.path, db.fingerprint(), start, db)
@@ -0,0 +1,200 @@
+import difflib
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+# 同期済みの行のハッシュを保存するファイル
+STATE_PATH = 'sheet_sync_state.json'
+
+
+def _cell(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    return str(value)
+
+
+def row_hash(values):
+    """1行分の値（文字列のリスト）のハッシュ"""
+    return hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()
+
+
+def _column_letter(n):
+    # 1 -> A, 27 -> AA
+    letters = ''
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
+
+
+class SheetSync:
+    """データフレームとスプレッドシートの差分だけを書き込む同期処理
+
+    シートの2行目以降（1行目は見出し）に書いた行のハッシュを覚えておき、
+    次の同期では末尾に増えた行をappend_rowsで1回で追加する。途中で消えた行・増えた行はスプレッドシートの
+    batch_update（deleteDimension・insertDimension）の1回で行ごと消し・差し込み、中身が変わった行だけを書き込む。
+    """
+
+    def __init__(self, worksheet, state_path=STATE_PATH, state_key=None):
+        self.worksheet = worksheet
+        self.state_path = state_path
+        self.state_key = state_key or getattr(worksheet, 'title', 'default')
+        self._header = None
+        self._hashes = None
+
+    def _load_state(self):
+        if self._hashes is not None:
+            return
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f).get(self.state_key)
+            if state is not None:
+                self._header, self._hashes = state['header'], state['hashes']
+                return
+        # 状態ファイルがなければ1回だけシート全体を読んで作る
+        data = self.worksheet.get_all_values()
+        self._header = data[0] if data else None
+        self._hashes = [row_hash(row) for row in data[1:]]
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        state[self.state_key] = {'header': self._header, 'hashes': self._hashes}
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+    @staticmethod
+    def _rows(df):
+        return [[_cell(v) for v in row] for row in df.itertuples(index=False, name=None)]
+
+    def append(self, df):
+        """新しい行だけをシートの末尾に追加する（既存の行は読まない）"""
+        self._load_state()
+        rows = self._rows(df)
+        if not rows:
+            return 0
+        if self._header is None:
+            self._header = [str(c) for c in df.columns]
+            rows = [self._header] + rows
+            self.worksheet.append_rows(rows, value_input_option='USER_ENTERED')
+            rows = rows[1:]
+        else:
+            self.worksheet.append_rows(rows, value_input_option='USER_ENTERED')
+        self._hashes.extend(row_hash(row) for row in rows)
+        self._save_state()
+        return len(rows)
+
+    def _dimension_request(self, kind, start, count):
+        # 記録のstart番目（0始まり）からcount行。シートの行番号は見出しの分だけずれる
+        rows = {'sheetId': self.worksheet.id, 'dimension': 'ROWS', 'startIndex': start + 1, 'endIndex': start + 1 + count}
+        if kind == 'delete':
+            return {'deleteDimension': {'range': rows}}
+        return {'insertDimension': {'range': rows, 'inheritFromBefore': True}}
+
+    def sync(self, df):
+        """シートの内容をdfと同じにする。書き込んだ行数を返す"""
+        self._load_state()
+        rows = self._rows(df)
+        hashes = [row_hash(row) for row in rows]
+
+        # 前回の行と今回の行をハッシュで突き合わせる（同じ行が多くても間引かれないようにautojunkは使わない）
+        opcodes = difflib.SequenceMatcher(None, self._hashes, hashes, autojunk=False).get_opcodes()
+        changed = [op for op in opcodes if op[0] != 'equal']
+        if not changed:
+            return 0
+        if len(changed) == 1 and changed[0][0] == 'insert' and changed[0][1] == len(self._hashes):
+            # 末尾に増えただけならappend_rowsの1回で済む
+            return self.append(df.iloc[changed[0][3]:])
+
+        # 行を消す・差し込むリクエスト（後ろから並べると、前の行の位置がずれない）
+        structure = []
+        writes = []
+        for tag, i1, i2, j1, j2 in reversed(changed):
+            old_count, new_count = i2 - i1, j2 - j1
+            if old_count > new_count:
+                structure.append(self._dimension_request('delete', i1 + new_count, old_count - new_count))
+            elif new_count > old_count and i2 < len(self._hashes):
+                # シートの末尾より後ろは差し込まなくても書き込める
+                structure.append(self._dimension_request('insert', i2, new_count - old_count))
+            if new_count:
+                writes.append((j1, j2))
+        if structure:
+            self.worksheet.spreadsheet.batch_update({'requests': structure})
+
+        written = 0
+        if writes:
+            # 中身が変わった行・差し込んだ行だけを書き込む（行の位置はもう今回の並びになっている）
+            last_column = _column_letter(len(df.columns))
+            self.worksheet.batch_update(
+                [{'range': f'A{j1 + 2}:{last_column}{j2 + 1}', 'values': rows[j1:j2]} for j1, j2 in reversed(writes)],
+                value_input_option='USER_ENTERED')
+            written = sum(j2 - j1 for j1, j2 in writes)
+        self._hashes = hashes
+        self._save_state()
+        return written
+
+
+class LocalWorksheet:
+    """gspreadのWorksheetの代わりに使うメモリ上のシート（オフラインでの確認用）"""
+
+    def __init__(self, values=None, title='local'):
+        self.title = title
+        self.id = 0
+        self.values = [list(row) for row in (values or [])]
+        self.calls = []  # 呼ばれたAPIの記録
+        self.spreadsheet = LocalSpreadsheet(self)
+
+    def get_all_values(self):
+        self.calls.append('get_all_values')
+        # 空になった末尾の行は返さない（Google Sheetsと同じ）
+        values = [list(row) for row in self.values]
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def append_rows(self, values, value_input_option='RAW'):
+        self.calls.append('append_rows')
+        while self.values and not any(self.values[-1]):
+            self.values.pop()
+        self.values.extend(list(row) for row in values)
+
+    def _parse_range(self, a1_range):
+        start, end = a1_range.split(':')
+        start_row = int(''.join(c for c in start if c.isdigit()))
+        end_row = int(''.join(c for c in end if c.isdigit()))
+        return start_row, end_row
+
+    def batch_update(self, data, value_input_option='RAW'):
+        self.calls.append('batch_update')
+        for item in data:
+            start_row, _ = self._parse_range(item['range'])
+            for offset, row in enumerate(item['values']):
+                index = start_row - 1 + offset
+                while len(self.values) <= index:
+                    self.values.append([])
+                self.values[index] = list(row)
+
+class LocalSpreadsheet:
+    """LocalWorksheetのスプレッドシート（行の削除・差し込みのbatch_updateだけを扱う）"""
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def batch_update(self, body):
+        values = self.worksheet.values
+        self.worksheet.calls.append('spreadsheet.batch_update')
+        for request in body['requests']:
+            kind, = request
+            rows = request[kind]['range']
+            start, end = rows['startIndex'], rows['endIndex']
+            if kind == 'deleteDimension':
+                del values[start:end]
+            elif kind == 'insertDimension':
+                values[start:start] = [[] for _ in range(end - start)]
@@ -0,0 +1,43 @@
+import re
+import unicodedata
+
+import pandas as pd
+
+
+# 商品名から数量・内容量を取り出すパターン（NFKCで全角数字・ｍｌ・㎖は半角のmlにそろえてから使う）
+# 「24本×2ケース」「24本入り×2箱」「24缶入×2ケース」のようなまとめ買い
+MULTIPACK_PATTERN = re.compile(r'(\d+)\s*(?:本|缶)\s*(?:入り?)?\s*[×xX*]\s*(\d+)\s*(?:ケース|箱|パック|セット)')
+# 「24本」「6缶」
+QUANTITY_PATTERN = re.compile(r'(\d+)\s*(?:本|缶)')
+# 「350ml」「500ML」
+VOLUME_PATTERN = re.compile(r'(\d+)\s*ml', re.IGNORECASE)
+
+
+def normalize_title(title):
+    return unicodedata.normalize('NFKC', title)
+
+
+def parse_title(title):
+    """商品名から(数量, 内容量ml)を返す。見つからなければNone"""
+    title = normalize_title(title)
+    quantity = None
+    multipack_match = MULTIPACK_PATTERN.search(title)
+    if multipack_match:
+        quantity = int(multipack_match.group(1)) * int(multipack_match.group(2))
+    else:
+        quantity_match = QUANTITY_PATTERN.search(title)
+        if quantity_match:
+            quantity = int(quantity_match.group(1))
+    volume_match = VOLUME_PATTERN.search(title)
+    volume = int(volume_match.group(1)) if volume_match else None
+    return quantity, volume
+
+
+def parse_titles(titles):
+    """商品名のSeriesをまとめて解析し、quantity・volume列のデータフレームを返す"""
+    titles = pd.Series(titles, dtype='string').str.normalize('NFKC')
+    multipack = titles.str.extract(MULTIPACK_PATTERN).astype('Float64')
+    single = titles.str.extract(QUANTITY_PATTERN)[0].astype('Float64')
+    volume = titles.str.extract(VOLUME_PATTERN)[0].astype('Float64')
+    quantity = (multipack[0] * multipack[1]).fillna(single)
+    return pd.DataFrame({'quantity': quantity.astype('Int64'), 'volume': volume.astype('Int64')})
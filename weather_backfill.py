@@ -0,0 +1,100 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from providers import ARCHIVE_URL, fetch_json
+from request_layer import shared_get
+
+
+# この日数以内のすきまは同じリクエストにまとめる
+DEFAULT_MAX_GAP_DAYS = 7
+
+# 補完の結果（recordsは埋めたデータフレーム、failedは取得できなかった(開始日, 終了日)の範囲）
+BackfillResult = namedtuple('BackfillResult', ['records', 'failed'])
+
+
+def requests_backend(url, params):
+    """既定のHTTPバックエンド（共有のリクエスト層でGETしてJSONを返す）"""
+    response = shared_get('open-meteo', url, params, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def provider_backend(url, params):
+    """共有の取得元（providers）のアーカイブから取得する。取得先は取得元が決めるのでurlは使わない"""
+    return fetch_json('archive', params)
+
+
+def missing_weather_dates(df):
+    """天気（最高気温）が入っていない記録の日付を重複なしで並べて返す"""
+    dates = pd.to_datetime(df['date'])
+    missing = df['temperature_max'].isna() if 'temperature_max' in df.columns else pd.Series(True, index=df.index)
+    return np.unique(dates[missing & dates.notna()].to_numpy().astype('datetime64[D]'))
+
+
+def date_ranges(dates, max_gap_days=DEFAULT_MAX_GAP_DAYS):
+    """並んだ日付を連続した(開始日, 終了日)の範囲にまとめる"""
+    if len(dates) == 0:
+        return []
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    gaps = np.diff(dates).astype(np.int64)
+    breaks = np.flatnonzero(gaps > max_gap_days + 1)
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks, [len(dates) - 1]])
+    return [(dates[s], dates[e]) for s, e in zip(starts, ends)]
+
+
+def fetch_range(latitude, longitude, start, end, backend=provider_backend, url=ARCHIVE_URL):
+    """1つの範囲をまとめて1回で取得し、date, weather_code, temperature_2m_maxのデータフレームで返す"""
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": ["weather_code", "temperature_2m_max"],
+        "timezone": "auto",
+        "start_date": str(start),
+        "end_date": str(end),
+    }
+    daily_data = backend(url, params)['daily']
+    return pd.DataFrame({
+        "date": pd.to_datetime(daily_data['time']),
+        "weather_code": daily_data['weather_code'],
+        "temperature_2m_max": daily_data['temperature_2m_max'],
+    })
+
+
+def backfill_weather(df, latitude, longitude, descriptions=None, backend=provider_backend, url=ARCHIVE_URL,
+                     max_gap_days=DEFAULT_MAX_GAP_DAYS):
+    """天気が空の記録に、過去の天気をまとめて取得して埋めたBackfillResultを返す（元のdfは変更しない）
+
+    範囲ごとに取得し、取得できなかった範囲（アーカイブにまだ無い日・タイムアウト・遮断中など）は
+    空のままにしてfailedで返す。取得できた範囲は埋める。
+    """
+    frames, failed = [], []
+    for start, end in date_ranges(missing_weather_dates(df), max_gap_days):
+        try:
+            frames.append(fetch_range(latitude, longitude, start, end, backend, url))
+        except Exception:
+            failed.append((start, end))
+    if not frames:
+        return BackfillResult(df, failed)
+    weather = pd.concat(frames, ignore_index=True).drop_duplicates('date').set_index('date')
+
+    df = df.copy()
+    # 記録の文字列の列はカテゴリ型なので、新しい曜日・天気を入れられるようにobjectにしてから埋める
+    for col in ('day_of_week', 'weather_description'):
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    dates = pd.to_datetime(df['date'])
+    # 日付をキーにして列ごとにまとめて埋める
+    codes = dates.map(weather['weather_code'])
+    categories = codes // 10
+    temperatures = dates.map(weather['temperature_2m_max'])
+    fill = df['temperature_max'].isna() if 'temperature_max' in df.columns else pd.Series(True, index=df.index)
+    df.loc[fill, 'temperature_max'] = temperatures[fill]
+    df.loc[fill, 'weather_category'] = categories[fill]
+    if 'day_of_week' in df.columns:
+        df.loc[fill, 'day_of_week'] = df.loc[fill, 'day_of_week'].fillna(dates[fill].dt.day_name())
+    if descriptions is not None:
+        df.loc[fill, 'weather_description'] = categories[fill].map(descriptions)
+    return BackfillResult(df, failed)
@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+import time
+from datetime import date as date_type, timedelta
+
+import pandas as pd
+
+from providers import fetch_response
+from instrumentation import note_cache
+
+
+# 天気キャッシュを保存するSQLiteファイル
+WEATHER_DB_PATH = 'weather_cache.db'
+
+# 予報（今日以降）のデータはこの秒数で期限切れにする
+FORECAST_TTL = 3 * 60 * 60
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS weather (
+    latitude REAL,
+    longitude REAL,
+    date TEXT,
+    weather_code INTEGER,
+    temperature_2m_max REAL,
+    fetched_at REAL,
+    final INTEGER,
+    PRIMARY KEY (latitude, longitude, date)
+)
+"""
+
+
+class ReplayedDays(dict):
+    """本物のAPIの代わりに記録から返した天気（確定値として保存しない）"""
+
+
+def fetch_open_meteo_daily(latitude, longitude, start_date, end_date):
+    """Open-Meteoから期間内の日ごとの天気を1回のリクエストで取得"""
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": ["weather_code", "temperature_2m_max"],
+        "timezone": "auto",
+        "start_date": start_date.strftime('%Y-%m-%d'),
+        "end_date": end_date.strftime('%Y-%m-%d'),
+    }
+    # 取得元（本物のAPI・記録・モックサーバー）はprovidersで切り替える
+    response = fetch_response('forecast', params)
+    daily_data = response.data['daily']
+    days = {
+        day: (code, temp)
+        for day, code, temp in zip(daily_data['time'], daily_data['weather_code'], daily_data['temperature_2m_max'])
+    }
+    return ReplayedDays(days) if response.replayed else days
+
+
+def _as_date(value):
+    return pd.Timestamp(value).date()
+
+
+class WeatherCache:
+    """(緯度, 経度, 日付)ごとに天気を保存するキャッシュ
+
+    過去の日は確定値なので二度と取得しない。今日以降の予報と記録から返した天気（ReplayedDays）は
+    FORECAST_TTLで期限切れにする。
+    足りない日はまとめて1回のリクエストで取得する。
+    """
+
+    def __init__(self, path=WEATHER_DB_PATH, fetcher=fetch_open_meteo_daily, ttl=FORECAST_TTL):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(CREATE_TABLE_SQL)
+
+    def close(self):
+        self._conn.close()
+
+    def _cached(self, latitude, longitude, start, end):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, weather_code, temperature_2m_max, fetched_at, final FROM weather "
+                "WHERE latitude = ? AND longitude = ? AND date BETWEEN ? AND ?",
+                (latitude, longitude, start.isoformat(), end.isoformat())).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def _missing_days(self, cached, start, end, now):
+        missing = []
+        day = start
+        while day <= end:
+            row = cached.get(day.isoformat())
+            if row is None or (not row[3] and now - row[2] > self.ttl):
+                missing.append(day)
+            day += timedelta(days=1)
+        return missing
+
+    def _store(self, latitude, longitude, fetched, now, today):
+        replayed = isinstance(fetched, ReplayedDays)
+        rows = [(latitude, longitude, day, code, temp, now,
+                 int(not replayed and date_type.fromisoformat(day) < today))
+                for day, (code, temp) in fetched.items()]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def get_range(self, latitude, longitude, start_date, end_date):
+        """期間内の天気をdate, weather_code, temperature_2m_maxのデータフレームで返す"""
+        start, end = _as_date(start_date), _as_date(end_date)
+        now = time.time()
+        today = date_type.today()
+        cached = self._cached(latitude, longitude, start, end)
+        missing = self._missing_days(cached, start, end, now)
+        note_cache(not missing)
+        if missing:
+            # 足りない日をまとめて、最初から最後までを1回で取得する
+            try:
+                fetched = self.fetcher(latitude, longitude, missing[0], missing[-1])
+            except Exception:
+                # つながらないときは、期限切れでもキャッシュに全部の日があればそれを返す
+                if any(day.isoformat() not in cached for day in missing):
+                    raise
+            else:
+                self._store(latitude, longitude, fetched, now, today)
+                cached.update({day: (code, temp, now, 0) for day, (code, temp) in fetched.items()})
+
+        days = sorted(day for day in cached if start.isoformat() <= day <= end.isoformat())
+        return pd.DataFrame({
+            "date": pd.to_datetime(days),
+            "weather_code": [cached[day][0] for day in days],
+            "temperature_2m_max": [cached[day][1] for day in days],
+        })